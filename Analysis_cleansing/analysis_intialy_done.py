@@ -1,7 +1,13 @@
+import os
+import sys
+
 import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
 
+# Share the rolling window helpers with the Django app
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'driving_analysis'))
+from api.rolling import rolling_range
+
 # Load the driving data
 driving_data = pd.read_csv(r"C:\\Users\\zahid\\Desktop\\FINAL_PROJECT_FILES\\work\\data cleaning\\dedo\\cleaned_harsh_data.csv")
 
@@ -66,7 +72,7 @@ def analyze_chunk(chunk_df):
 
         # Swerving detection logic
         window_swerve = 12  # Window size for checking angle change
-        chunk_df['yaw_change'] = chunk_df['Yaw'].rolling(window=window_swerve, min_periods=1, center=True).apply(lambda x: max(x) - min(x), raw=True).abs()
+        chunk_df['yaw_change'] = rolling_range(chunk_df['Yaw'], window_swerve, center=True, min_periods=1)
         swerve_mask = (
             (chunk_df['yaw_change'] >= 4) & (chunk_df['yaw_change'] <= 12) & 
             (chunk_df['Ay'].abs() > 2000)  # Aggressiveness condition based on Az
@@ -80,7 +86,7 @@ def analyze_chunk(chunk_df):
         
         # Additional logic to reset label to 'Normal' if change in degree > 40 in a window of 50 readings
         window_reset = 90
-        chunk_df['large_yaw_change'] = chunk_df['Yaw'].rolling(window=window_reset, min_periods=1, center=True).apply(lambda x: max(x) - min(x), raw=True).abs()
+        chunk_df['large_yaw_change'] = rolling_range(chunk_df['Yaw'], window_reset, center=True, min_periods=1)
         reset_mask = chunk_df['large_yaw_change'] > 40
         chunk_df.loc[reset_mask, 'labels'] = 'Normal'
 
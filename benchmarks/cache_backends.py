@@ -0,0 +1,102 @@
+"""
+Benchmark the cache backends on the keys the ingest path and the views use.
+
+Compares Django's FileBasedCache (the previous default) and LocMemCache with
+the api.cache_backends LRUCache, SharedMemoryCache and TieredCache. Each
+workload repeatedly reads or writes one kind of value: a generation number, a
+latest position, and a window of cleansed records. All caches live in a
+temporary directory that is removed afterwards.
+
+Usage:
+    python benchmarks/cache_backends.py [--ops N] [--repeat N] [--records N]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'driving_analysis'))
+
+BACKENDS = {
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'lru': 'api.cache_backends.LRUCache',
+    'shared': 'api.cache_backends.SharedMemoryCache',
+    'tiered': 'api.cache_backends.TieredCache',
+}
+
+
+def configure(directory):
+    import django
+    from django.conf import settings
+
+    caches = {}
+    for name, backend in BACKENDS.items():
+        location = name
+        if name == 'file':
+            location = os.path.join(directory, 'file')
+        elif name in ('shared', 'tiered'):
+            location = os.path.join(directory, f'{name}.sqlite3')
+        caches[name] = {'BACKEND': backend, 'LOCATION': location, 'OPTIONS': {'MAX_ENTRIES': 10000}}
+    caches['default'] = caches['locmem']
+    settings.configure(CACHES=caches, USE_TZ=True)
+    django.setup()
+
+
+def workloads(records):
+    window = [
+        {'timestamp': f'12:00:{i % 60:02d}.{i % 1000:03d}', 'latitude': 21.48 + i * 1e-5, 'longitude': 39.19,
+         'speed': 42.0, 'ax': 0.1, 'ay': 0.2, 'az': 9.8, 'yaw': 12.5}
+        for i in range(records)
+    ]
+    position = {'latitude': 21.4858, 'longitude': 39.1925, 'speed': 42.0, 'device_id': 'DBAS-001',
+                'updated_at': time.time(), 'seq': 1}
+    return [
+        ('generation', 1792258973825222234),
+        ('position', position),
+        (f'window {records}', window),
+    ]
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ops', type=int, default=2000, help='Operations per measurement')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement, the best one is reported')
+    parser.add_argument('--records', type=int, default=1000, help='Records in the window workload')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='cache_bench_')
+    try:
+        configure(directory)
+        from django.core.cache import caches
+
+        print(f"{'workload':<16}{'backend':<10}{'get/s':>12}{'set/s':>12}")
+        for workload, value in workloads(args.records):
+            ops = args.ops if not workload.startswith('window') else max(args.ops // 20, 1)
+            for name in BACKENDS:
+                cache = caches[name]
+                cache.clear()
+                cache.set('key', value, None)
+                if cache.get('key') != value:
+                    sys.exit(f'{name} returned a different value for {workload}')
+                get_time = best_of(lambda: [cache.get('key') for _ in range(ops)], args.repeat)
+                set_time = best_of(lambda: [cache.set('key', value, None) for _ in range(ops)], args.repeat)
+                print(f"{workload:<16}{name:<10}{ops / get_time:>12,.0f}{ops / set_time:>12,.0f}")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
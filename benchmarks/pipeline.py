@@ -0,0 +1,310 @@
+"""
+Benchmark the ingest pipeline stages on the recorded Analysis_cleansing traces.
+
+Replays every Analysis_cleansing/cleaned_*.csv trace as ESP32 MQTT payloads
+and runs them through the stages of the ingest worker, in order and on one
+thread:
+
+    parse     telemetry_parser.parse_payload, per payload
+    cleanse   columnar cleansing (or cleanse_data with --cleanse legacy), per window
+    analyze   analysis.analyze_data, per window
+    score     views.score_chunk with the car's weights, per window
+    write     bulk_writer.DrivingDataWriter flushes (with rollups and trips), per
+              flush; its rows are counted as the lines of their windows
+
+The traces are repeated, with a synthetic 10 Hz clock, until --rows lines are
+produced, split over --devices devices that each start at another point of
+the recordings. Payloads are generated while the benchmark runs, so memory
+stays flat at any scale. Rows are written to a temporary SQLite database.
+
+Each stage reports its throughput in telemetry lines per second, p50/p99
+latency per call and the process peak RSS, as JSON. With --baseline, the run
+fails when a stage's throughput dropped by more than --tolerance.
+
+Usage:
+    python benchmarks/pipeline.py [--rows N] [--devices N] [--payload-lines N]
+        [--cleanse columnar|legacy] [--engine pandas|fused] [--output FILE]
+        [--baseline FILE] [--tolerance 0.2]
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'driving_analysis'))
+
+STAGES = ('parse', 'cleanse', 'analyze', 'score', 'write')
+
+# Synthetic clock of the replayed traces (the GPS rate of the devices)
+SAMPLE_PERIOD = 0.1
+START_SECONDS = 8 * 3600
+
+# CSV columns of the traces, in payload field order after device, counter and timestamp
+TRACE_COLUMNS = ('Latitude', 'Longitude', 'Speed(km/h)', 'Ax', 'Ay', 'Az', 'Yaw')
+
+# Distance between the device tracks, in degrees, so the devices don't share positions
+DEVICE_OFFSET = 0.01
+
+
+def configure(directory, engine):
+    """Project settings with a temporary SQLite database and a local cache."""
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+
+    from driving_analysis import settings as project_settings
+
+    overrides = {name: getattr(project_settings, name) for name in dir(project_settings) if name.isupper()}
+    overrides.update(
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(directory, 'db.sqlite3')}},
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        LOCATION_SNAPSHOT_INTERVAL=3600,
+    )
+    if engine:
+        overrides['ANALYSIS_ENGINE'] = engine
+    settings.configure(**overrides)
+    django.setup()
+    call_command('migrate', verbosity=0)
+
+
+def load_traces():
+    paths = sorted(glob.glob(os.path.join(ROOT, 'Analysis_cleansing', 'cleaned_*.csv')))
+    if not paths:
+        sys.exit('No Analysis_cleansing/cleaned_*.csv files found')
+    frames = [pd.read_csv(path, usecols=TRACE_COLUMNS) for path in paths]
+    values = pd.concat(frames, ignore_index=True)[list(TRACE_COLUMNS)].to_numpy(dtype=np.float64)
+    return [os.path.basename(path) for path in paths], values
+
+
+def clock(seconds):
+    seconds = seconds % 86400
+    return f'{int(seconds // 3600):02d}:{int(seconds // 60 % 60):02d}:{seconds % 60:06.3f}'
+
+
+def payloads(trace, rows, devices, payload_lines):
+    """
+    Yield (device_name, payload bytes, line count), round robin over the devices.
+
+    Every device replays the concatenated traces from its own starting point,
+    with a continuous clock, until ``rows`` lines have been produced in total.
+    """
+    per_device = -(-rows // devices)
+    remaining = rows
+    for start in range(0, per_device, payload_lines):
+        for device in range(devices):
+            count = min(payload_lines, per_device - start, remaining)
+            if count <= 0:
+                return
+            remaining -= count
+            name = f'BENCH-{device:04d}'
+            lines = []
+            for sample in range(start, start + count):
+                index = (sample + device * len(trace) // devices) % len(trace)
+                lat, lon, speed, ax, ay, az, yaw = trace[index]
+                lines.append(
+                    f'{name},{sample},{clock(START_SECONDS + sample * SAMPLE_PERIOD)},'
+                    f'{lat + device * DEVICE_OFFSET:.6f},{lon:.6f},{speed:.2f},'
+                    f'{ax:.0f},{ay:.0f},{az:.0f},{yaw:.2f},0'
+                )
+            yield name, '\n'.join(lines).encode(), count
+
+
+class StageTimer:
+    """Per-call latencies and processed rows of one stage."""
+
+    def __init__(self):
+        self.latencies = []
+        self.rows = 0
+
+    @contextlib.contextmanager
+    def measure(self, rows):
+        started = time.perf_counter()
+        yield
+        self.latencies.append(time.perf_counter() - started)
+        self.rows += rows
+
+    def add(self, seconds, rows):
+        self.latencies.append(seconds)
+        self.rows += rows
+
+    def report(self):
+        seconds = float(np.sum(self.latencies)) if self.latencies else 0.0
+        latencies_ms = np.array(self.latencies) * 1000
+        return {
+            'calls': len(self.latencies),
+            'rows': self.rows,
+            'seconds': round(seconds, 4),
+            'rows_per_s': round(self.rows / seconds, 1) if seconds else None,
+            'p50_ms': round(float(np.percentile(latencies_ms, 50)), 3) if len(latencies_ms) else None,
+            'p99_ms': round(float(np.percentile(latencies_ms, 99)), 3) if len(latencies_ms) else None,
+        }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run(args):
+    from api.analysis import analyze_data
+    from api.bulk_writer import DrivingDataWriter
+    from api.cleansing_data import cleanse_data
+    from api.columnar_cleansing import cleanse_columns
+    from api.models import Car
+    from api.ring_buffer import DeviceRingBuffer
+    from api.telemetry_parser import parse_payload
+    from api.views import score_chunk
+
+    timers = {stage: StageTimer() for stage in STAGES}
+    devices = {}
+
+    def on_flush(rows_written, seconds, wait_seconds):
+        # Every stored row is the summary of one full window
+        timers['write'].add(seconds, rows_written * args.window)
+
+    def process_window(car_id, window):
+        rows = len(window['timestamp'])
+        with timers['cleanse'].measure(rows):
+            if args.cleanse == 'legacy':
+                cleaned = cleanse_data(window)
+            else:
+                cleaned = cleanse_columns(window).to_dataframe()
+        if cleaned.empty:
+            return
+        with timers['analyze'].measure(rows):
+            results = analyze_data(cleaned)
+        with timers['score'].measure(rows):
+            score = score_chunk(None, results, car_id)
+        writer.add(
+            car_id_id=car_id,
+            speed=float(cleaned['speed'].mean()),
+            distance=results.get('distance_km', 0.1),
+            harsh_braking_events=results.get('harsh_braking_events', 0),
+            harsh_acceleration_events=results.get('harsh_acceleration_events', 0),
+            swerving_events=results.get('swerving_events', 0),
+            potential_swerving_events=results.get('potential_swerving_events', 0),
+            over_speed_events=results.get('over_speed_events', 0),
+            score=score,
+            accident_detection=bool(window['accident'].any()),
+        )
+
+    started = time.perf_counter()
+    # Flushes only by size, so every flush writes a full batch
+    with DrivingDataWriter(flush_interval_ms=float('inf'), on_flush=on_flush) as writer:
+        for name, payload, count in payloads(args.trace, args.rows, args.devices, args.payload_lines):
+            if name not in devices:
+                car = Car.objects.create(Model_of_car='Benchmark', TypeOfCar='sedan', Plate_number=name,
+                                         Release_Year_car=2024, State_of_car='online', device_id=name)
+                devices[name] = (car.id, DeviceRingBuffer(name, args.window))
+            car_id, buffer = devices[name]
+
+            with timers['parse'].measure(count):
+                batch = parse_payload(payload)
+            columns = batch.for_device(name)
+            offset = 0
+            while offset < len(columns['timestamp']):
+                offset += buffer.extend(columns, offset)
+                if buffer.is_full():
+                    process_window(car_id, buffer.drain())
+    elapsed = time.perf_counter() - started
+
+    return {
+        'config': {
+            'rows': args.rows,
+            'devices': args.devices,
+            'payload_lines': args.payload_lines,
+            'window': args.window,
+            'cleanse': args.cleanse,
+            'engine': args.engine or 'default',
+            'batch_size': writer.batch_size,
+            'traces': args.trace_names,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+        },
+        'stages': {stage: timers[stage].report() for stage in STAGES},
+        'total_seconds': round(elapsed, 3),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def regressions(result, baseline, tolerance):
+    """Stages whose throughput is more than ``tolerance`` below the baseline's."""
+    slower = []
+    for stage, report in result['stages'].items():
+        before = baseline.get('stages', {}).get(stage, {}).get('rows_per_s')
+        after = report['rows_per_s']
+        if before and after is not None and after < before * (1 - tolerance):
+            slower.append(f'{stage}: {after:,.0f} rows/s, baseline {before:,.0f} rows/s')
+    return slower
+
+
+def print_summary(result, stream):
+    print(f"{'stage':<10}{'calls':>8}{'rows/s':>14}{'p50 ms':>10}{'p99 ms':>10}", file=stream)
+    for stage, report in result['stages'].items():
+        rate = f"{report['rows_per_s']:,.0f}" if report['rows_per_s'] else '-'
+        p50 = report['p50_ms'] if report['p50_ms'] is not None else '-'
+        p99 = report['p99_ms'] if report['p99_ms'] is not None else '-'
+        print(f"{stage:<10}{report['calls']:>8}{rate:>14}{p50:>10}{p99:>10}", file=stream)
+    print(f"total {result['total_seconds']} s, peak RSS {result['peak_rss_mb']} MB", file=stream)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=None,
+                        help='Telemetry lines to replay (default: every trace once)')
+    parser.add_argument('--devices', type=int, default=1, help='Devices the lines are spread over')
+    parser.add_argument('--payload-lines', type=int, default=100, help='Lines per MQTT payload')
+    parser.add_argument('--window', type=int, default=1000, help='Lines per analysis window (ring buffer capacity)')
+    parser.add_argument('--cleanse', choices=('columnar', 'legacy'), default='columnar',
+                        help='Columnar cleansing as in the ingest worker, or cleanse_data')
+    parser.add_argument('--engine', choices=('pandas', 'fused'), default=None,
+                        help='Analysis engine (default: ANALYSIS_ENGINE)')
+    parser.add_argument('--output', default='-', help='JSON report file (default: stdout)')
+    parser.add_argument('--baseline', help='Earlier JSON report to compare the throughput with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed throughput drop against the baseline (default: 0.2)')
+    args = parser.parse_args()
+
+    args.trace_names, args.trace = load_traces()
+    if args.rows is None:
+        args.rows = len(args.trace)
+
+    directory = tempfile.mkdtemp(prefix='pipeline_bench_')
+    try:
+        configure(directory, args.engine)
+        # The stages print progress and diagnostics; keep stdout for the report
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result = run(args)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report = json.dumps(result, indent=2)
+    if args.output == '-':
+        print(report)
+    else:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    print_summary(result, sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slower = regressions(result, json.load(f), args.tolerance)
+        if slower:
+            sys.exit('Throughput regressions:\n  ' + '\n  '.join(slower))
+
+
+if __name__ == '__main__':
+    main()
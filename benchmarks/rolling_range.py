@@ -0,0 +1,62 @@
+"""
+Benchmark the yaw-change rolling range used by the swerving detector.
+
+Compares the original ``rolling(...).apply(lambda x: max(x) - min(x))`` with
+``api.rolling.rolling_range`` on every Analysis_cleansing/cleaned_*.csv trace,
+checks that both give the same values, and prints the timings.
+
+Usage:
+    python benchmarks/rolling_range.py [--repeat N] [--windows 12 90]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'driving_analysis'))
+
+from api.rolling import rolling_range  # noqa: E402
+
+
+def pandas_range(yaw, window):
+    return yaw.rolling(window=window, min_periods=1, center=True).apply(lambda x: max(x) - min(x), raw=True).abs()
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement, the best one is reported')
+    parser.add_argument('--windows', type=int, nargs='+', default=[12, 90], help='Window sizes to benchmark')
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(ROOT, 'Analysis_cleansing', 'cleaned_*.csv')))
+    if not paths:
+        sys.exit('No Analysis_cleansing/cleaned_*.csv files found')
+
+    print(f"{'dataset':<28}{'rows':>8}{'window':>8}{'pandas ms':>12}{'rolling ms':>12}{'speedup':>10}")
+    for path in paths:
+        yaw = pd.read_csv(path)['Yaw']
+        for window in args.windows:
+            pandas_time, expected = best_of(lambda: pandas_range(yaw, window), args.repeat)
+            fast_time, actual = best_of(lambda: rolling_range(yaw, window, center=True, min_periods=1), args.repeat)
+            if not np.allclose(expected.to_numpy(), actual.to_numpy(), equal_nan=True):
+                sys.exit(f'Mismatch on {path} with window {window}')
+            print(f"{os.path.basename(path):<28}{len(yaw):>8}{window:>8}"
+                  f"{pandas_time * 1000:>12.1f}{fast_time * 1000:>12.2f}{pandas_time / fast_time:>9.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,33 @@
 import pandas as pd
 import numpy as np
+from django.conf import settings
 
-def analyze_data(cleaned_data, car_id=None):
+from .detection import count_events, detect, label_names
+from .rolling import rolling_range
+
+# Ingest column name -> column name used by the analysis
+column_mapping = {
+    'counter': 'Counter',
+    'timestamp': 'Timestamp',
+    'latitude': 'Latitude',
+    'longitude': 'Longitude',
+    'speed': 'Speed(km/h)',
+    'ax': 'Ax',
+    'ay': 'Ay',
+    'az': 'Az',
+    'yaw': 'Yaw',
+
+}
+
+def analyze_data(cleaned_data, car_id=None, engine=None):
     """
     Analyze the cleaned driving data to extract insights about driving behavior
     using advanced statistical techniques.
     
     Args:
         cleaned_data (DataFrame): DataFrame containing cleansed data
+        engine (str): 'pandas' (default) or 'fused' for the array kernel in
+            api/detection.py; defaults to settings.ANALYSIS_ENGINE
     
     Returns:
         dict: Dictionary containing analysis results
@@ -15,6 +35,10 @@ def analyze_data(cleaned_data, car_id=None):
     # Check for valid data
     if not isinstance(cleaned_data, pd.DataFrame) or cleaned_data.empty:
         return {'error': 'No data to analyze'}
+
+    engine = engine or getattr(settings, 'ANALYSIS_ENGINE', 'pandas')
+    if engine == 'fused':
+        return analyze_data_fused(cleaned_data, car_id)
     
     # Initialize results dictionary
     results = {
@@ -28,20 +52,6 @@ def analyze_data(cleaned_data, car_id=None):
         'labels': []  # Store event labels for each data point
     }
     
-    # Prepare data - Rename columns to expected format if needed
-    column_mapping = {
-        'counter': 'Counter',
-        'timestamp': 'Timestamp',
-        'latitude': 'Latitude',
-        'longitude': 'Longitude',
-        'speed': 'Speed(km/h)',
-        'ax': 'Ax',
-        'ay': 'Ay',
-        'az': 'Az',
-        'yaw': 'Yaw',
-
-    }
-    
     # Create a copy to avoid modifying the original data
     df = cleaned_data.copy()
     
@@ -122,8 +132,7 @@ def analyze_data(cleaned_data, car_id=None):
         # Swerving detection using yaw changes
         if 'Yaw' in df.columns:
             window_swerve = 12  # Window size for checking angle change
-            df['yaw_change'] = df['Yaw'].rolling(window=window_swerve, min_periods=1, center=True).apply(
-                lambda x: max(x) - min(x), raw=True).abs()
+            df['yaw_change'] = rolling_range(df['Yaw'], window_swerve, center=True, min_periods=1)
             
             # Main swerving detection
             if 'Ay' in df.columns:
@@ -135,8 +144,7 @@ def analyze_data(cleaned_data, car_id=None):
             
             # Reset labels if too large changes in yaw (likely not real swerving)
             window_reset = 90
-            df['large_yaw_change'] = df['Yaw'].rolling(window=window_reset, min_periods=1, center=True).apply(
-                lambda x: max(x) - min(x), raw=True).abs()
+            df['large_yaw_change'] = rolling_range(df['Yaw'], window_reset, center=True, min_periods=1)
             reset_mask = df['large_yaw_change'] > 40
             df.loc[reset_mask, 'labels'] = 'Normal'
     
@@ -205,4 +213,28 @@ def analyze_data(cleaned_data, car_id=None):
     # Store labels for future reference
     results['labels'] = df['labels'].tolist()
     
-    return results
\ No newline at end of file
+    return results
+
+
+def analyze_data_fused(cleaned_data, car_id=None):
+    """
+    Same results as ``analyze_data``, computed by the fused detection kernel.
+
+    Labels are handled as integer codes (``label_codes``) throughout and only
+    converted to strings for the returned ``labels`` list.
+    """
+    df = cleaned_data.rename(columns={k: v for k, v in column_mapping.items() if k in cleaned_data.columns})
+    codes, detected_events = detect(df)
+
+    results = {
+        'detected_events': detected_events,
+        'potential_swerving_events': 0,
+        **count_events(codes),
+    }
+
+    from .views import score_chunk
+    results['score'] = score_chunk(df, results, car_id)
+
+    results['label_codes'] = codes
+    results['labels'] = label_names(codes)
+    return results
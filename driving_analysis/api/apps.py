@@ -5,6 +5,8 @@ class ApiConfig(AppConfig):
     name = 'api'
 
     def ready(self):
+        from . import signals  # noqa: F401 (connects the receivers)
+
         global shared_data_global
         manager = Manager()
         shared_data_global = manager.dict()
@@ -0,0 +1,166 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .overview_cache import bump_data_generation
+from .rollups import add_to_rollups
+from .trips import add_to_trips
+
+logger = logging.getLogger(__name__)
+
+
+class DrivingDataWriter:
+    """
+    Buffer DrivingData rows and store them with ``bulk_create``.
+
+    Rows are flushed once ``batch_size`` rows are pending or the oldest
+    pending row has waited ``flush_interval_ms``. Time-based flushes happen
+    on the next ``add`` or when the owner calls ``flush_if_due``; ``close``
+    (or leaving a ``with`` block) flushes whatever is left.
+
+    When a flush fails, its rows are queued again and retried once the
+    flush interval has passed, as long as no more than ``max_pending`` rows
+    are waiting; the oldest rows beyond that are dropped and counted.
+
+    Example:
+        with DrivingDataWriter(batch_size=500) as writer:
+            for row in rows:
+                writer.add(car_id_id=car_id, speed=row.speed, ...)
+    """
+
+    def __init__(self, batch_size=None, flush_interval_ms=None, on_flush=None, max_pending=None, on_drop=None):
+        self.batch_size = batch_size or getattr(settings, 'INGEST_WRITE_BATCH_SIZE', 500)
+        if flush_interval_ms is None:
+            flush_interval_ms = getattr(settings, 'INGEST_WRITE_INTERVAL', 1.0) * 1000
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_pending = max_pending or getattr(settings, 'INGEST_WRITE_MAX_PENDING', self.batch_size * 10)
+        # Called as on_flush(rows_written, seconds, wait_seconds) after every flush
+        self.on_flush = on_flush
+        # Called as on_drop(rows_dropped) when rows of failed flushes are given up
+        self.on_drop = on_drop
+
+        self._pending = []
+        self._oldest = None
+        self._lock = threading.Lock()
+
+        # Flush metrics
+        self.flushes = 0
+        self.rows_written = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+        self.failed_flushes = 0
+        self.rows_dropped = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, instance=None, **fields):
+        """
+        Queue one row, given either as a DrivingData instance or as field values.
+
+        Returns:
+            int: Number of rows written by a flush this call triggered, else 0
+        """
+        from .models import DrivingData
+
+        if instance is None:
+            instance = DrivingData(**fields)
+        with self._lock:
+            self._pending.append(instance)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = len(self._pending) >= self.batch_size
+        if full:
+            return self.flush()
+        return self.flush_if_due()
+
+    def flush_if_due(self):
+        """Flush if the oldest pending row has waited longer than the flush interval."""
+        oldest = self._oldest
+        if oldest is not None and time.monotonic() - oldest >= self.flush_interval:
+            return self.flush()
+        return 0
+
+    def seconds_until_due(self):
+        """Time left before a time-based flush is due, or None when nothing is pending."""
+        oldest = self._oldest
+        if oldest is None:
+            return None
+        return max(0.0, oldest + self.flush_interval - time.monotonic())
+
+    def flush(self):
+        """Write all pending rows with one bulk_create and add them to the daily rollups and trips."""
+        from .models import DrivingData
+
+        with self._lock:
+            rows, self._pending = self._pending, []
+            oldest, self._oldest = self._oldest, None
+        if not rows:
+            return 0
+
+        started = time.monotonic()
+        try:
+            with transaction.atomic():
+                DrivingData.objects.bulk_create(rows, batch_size=self.batch_size)
+                add_to_rollups(rows)
+                add_to_trips(rows)
+        except Exception:
+            self._requeue(rows)
+            raise
+        bump_data_generation()
+        elapsed = time.monotonic() - started
+
+        elapsed_ms = elapsed * 1000
+        self.flushes += 1
+        self.rows_written += len(rows)
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.total_flush_ms += elapsed_ms
+        logger.debug(f"Flushed {len(rows)} DrivingData rows in {elapsed_ms:.1f} ms")
+
+        if self.on_flush:
+            self.on_flush(len(rows), elapsed, started - oldest)
+        return len(rows)
+
+    def _requeue(self, rows):
+        """Put the rows of a failed flush back in front of the pending ones, within max_pending."""
+        for row in rows:
+            # bulk_create may have set primary keys before the transaction rolled back
+            row.pk = None
+        with self._lock:
+            pending = rows + self._pending
+            dropped = max(len(pending) - self.max_pending, 0)
+            self._pending = pending[dropped:]
+            # Retry after a full interval rather than on every call
+            self._oldest = time.monotonic() if self._pending else None
+            self.failed_flushes += 1
+            self.rows_dropped += dropped
+        if dropped:
+            logger.warning(f"Dropped {dropped} DrivingData rows after failed flushes")
+            if self.on_drop:
+                self.on_drop(dropped)
+
+    def close(self):
+        return self.flush()
+
+    def metrics(self):
+        return {
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'pending': len(self._pending),
+            'failed_flushes': self.failed_flushes,
+            'rows_dropped': self.rows_dropped,
+            'last_flush_ms': round(self.last_flush_ms, 1),
+            'max_flush_ms': round(self.max_flush_ms, 1),
+            'avg_flush_ms': round(self.total_flush_ms / self.flushes, 1) if self.flushes else 0.0,
+        }
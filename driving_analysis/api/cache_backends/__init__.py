@@ -0,0 +1,3 @@
+from .lru import LRUCache, LRUStore
+from .shared import SharedMemoryCache
+from .tiered import TieredCache
@@ -0,0 +1,136 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class LRUStore:
+    """
+    Thread-safe map of key -> (pickled value, expiry) evicting the least recently used.
+
+    Both limits are exact: after every write the store holds at most
+    ``max_entries`` entries and ``max_bytes`` bytes of pickled values.
+    """
+
+    def __init__(self, max_entries, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def _pop(self, key):
+        pickled, _ = self._data.pop(key)
+        self._bytes -= len(pickled)
+
+    def _live(self, key):
+        """Entry of a key, dropping it when expired (call with the lock held)."""
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.time():
+            self._pop(key)
+            return None
+        return entry
+
+    def get(self, key):
+        """Pickled value of a live key, or None; marks the key as recently used."""
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, pickled, expires):
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (pickled, expires)
+            self._bytes += len(pickled)
+            while self._data and (len(self._data) > self.max_entries
+                                  or (self.max_bytes is not None and self._bytes > self.max_bytes)):
+                self._pop(next(iter(self._data)))
+
+    def add(self, key, pickled, expires):
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+        self.set(key, pickled, expires)
+        return True
+
+    def touch(self, key, expires):
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return False
+            self._data[key] = (entry[0], expires)
+            self._data.move_to_end(key)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            if key not in self._data:
+                return False
+            self._pop(key)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+
+# LRUCache stores by LOCATION, so every instance of one alias in a process shares it
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class LRUCache(BaseCache):
+    """
+    In-process cache with exact least-recently-used eviction.
+
+    Like LocMemCache, values are pickled so callers always get copies, but
+    entries are evicted one by one in LRU order instead of culling a fraction
+    of the cache, and the total size can be bounded as well.
+
+    OPTIONS:
+        MAX_ENTRIES (int): Entries kept (default 300)
+        MAX_BYTES (int): Total pickled size kept, no limit by default
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        with _stores_lock:
+            self._store = _stores.setdefault(name, LRUStore(self._max_entries, options.get('MAX_BYTES')))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._store.add(key, pickle.dumps(value, self.pickle_protocol), self.get_backend_timeout(timeout))
+
+    def get(self, key, default=None, version=None):
+        pickled = self._store.get(self.make_and_validate_key(key, version=version))
+        return default if pickled is None else pickle.loads(pickled)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._store.set(key, pickle.dumps(value, self.pickle_protocol), self.get_backend_timeout(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._store.touch(key, self.get_backend_timeout(timeout))
+
+    def delete(self, key, version=None):
+        return self._store.delete(self.make_and_validate_key(key, version=version))
+
+    def has_key(self, key, version=None):
+        return self._store.get(self.make_and_validate_key(key, version=version)) is not None
+
+    def clear(self):
+        self._store.clear()
@@ -0,0 +1,169 @@
+import os
+import pickle
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Shared memory when the host has it, so the cache file never touches the disk
+DEFAULT_LOCATION = os.path.join('/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+                                'driving_analysis_cache.sqlite3')
+
+EVICTION_POLICIES = ('lru', 'fifo')
+
+# Seconds between two updates of an entry's last use under LRU, so hot keys aren't rewritten on every read
+USE_RESOLUTION = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entry (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    used REAL NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_entry_used ON cache_entry (used);
+"""
+
+UPSERT = """
+INSERT INTO cache_entry (key, value, expires, used, size) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value, expires = excluded.expires, used = excluded.used, size = excluded.size
+"""
+
+# Entries past the size limits, the least recently used (or oldest) first
+OVER_LIMITS = """
+DELETE FROM cache_entry WHERE key IN (
+    SELECT key FROM (
+        SELECT key, ROW_NUMBER() OVER newest AS position, SUM(size) OVER newest AS kept_bytes
+        FROM cache_entry WINDOW newest AS (ORDER BY used DESC)
+    ) WHERE position > ? OR kept_bytes > ?
+)
+"""
+
+
+class SharedMemoryCache(BaseCache):
+    """
+    Cache shared by every process on the host (MQTT ingest and web workers).
+
+    Entries live in one SQLite database in WAL mode, by default on /dev/shm,
+    so reads don't block writes and nothing is written to disk. Each thread
+    keeps its own connection. The limits are enforced every ``CHECK_EVERY``
+    writes of a process, so the cache may briefly exceed them.
+
+    LOCATION: Database file (default /dev/shm/driving_analysis_cache.sqlite3)
+
+    OPTIONS:
+        MAX_ENTRIES (int): Entries kept (default 300)
+        MAX_BYTES (int): Total pickled size kept, no limit by default
+        EVICTION (str): 'lru' (default) evicts the least recently read or
+            written entries first, 'fifo' the least recently written
+        CHECK_EVERY (int): Writes between two checks of the limits (default 100)
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.path = location or DEFAULT_LOCATION
+        self.max_bytes = options.get('MAX_BYTES')
+        self.eviction = options.get('EVICTION', 'lru')
+        if self.eviction not in EVICTION_POLICIES:
+            raise ValueError(f"EVICTION must be one of {', '.join(EVICTION_POLICIES)}, not {self.eviction!r}")
+        self.check_every = int(options.get('CHECK_EVERY', 100))
+        self._local = threading.local()
+        self._writes = 0
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.executescript(SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    # ---- raw entries (final keys, pickled values) -------------------------
+
+    def get_entry(self, key):
+        """(pickled value, expiry) of a live key, or None."""
+        connection = self._connection()
+        row = connection.execute('SELECT value, expires, used FROM cache_entry WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        pickled, expires, used = row
+        now = time.time()
+        if expires is not None and expires <= now:
+            connection.execute('DELETE FROM cache_entry WHERE key = ? AND expires <= ?', (key, now))
+            return None
+        if self.eviction == 'lru' and now - used > USE_RESOLUTION:
+            connection.execute('UPDATE cache_entry SET used = ? WHERE key = ?', (now, key))
+        return pickled, expires
+
+    def set_entry(self, key, pickled, expires):
+        self._connection().execute(UPSERT, (key, pickled, expires, time.time(), len(pickled)))
+        self._wrote()
+
+    def add_entry(self, key, pickled, expires):
+        """Store a key unless it is live; returns whether it was stored."""
+        now = time.time()
+        added = self._connection().execute(
+            UPSERT + ' WHERE cache_entry.expires IS NOT NULL AND cache_entry.expires <= ?',
+            (key, pickled, expires, now, len(pickled), now),
+        ).rowcount > 0
+        if added:
+            self._wrote()
+        return added
+
+    def _wrote(self):
+        self._writes += 1
+        if self._writes % self.check_every == 0:
+            self.enforce_limits()
+
+    def enforce_limits(self):
+        """Drop expired entries, then the entries beyond MAX_ENTRIES and MAX_BYTES."""
+        connection = self._connection()
+        connection.execute('DELETE FROM cache_entry WHERE expires <= ?', (time.time(),))
+        max_bytes = self.max_bytes if self.max_bytes is not None else sys.maxsize
+        connection.execute(OVER_LIMITS, (self._max_entries, max_bytes))
+
+    # ---- Django cache API --------------------------------------------------
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self.add_entry(key, pickle.dumps(value, self.pickle_protocol), self.get_backend_timeout(timeout))
+
+    def get(self, key, default=None, version=None):
+        entry = self.get_entry(self.make_and_validate_key(key, version=version))
+        return default if entry is None else pickle.loads(entry[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self.set_entry(key, pickle.dumps(value, self.pickle_protocol), self.get_backend_timeout(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time.time()
+        return self._connection().execute(
+            'UPDATE cache_entry SET expires = ?, used = ? WHERE key = ? AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), now, key, now),
+        ).rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute('DELETE FROM cache_entry WHERE key = ?', (key,)).rowcount > 0
+
+    def has_key(self, key, version=None):
+        return self.get_entry(self.make_and_validate_key(key, version=version)) is not None
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entry')
+
+    def close(self, **kwargs):
+        # Connections stay open across requests; the cache file outlives them anyway
+        pass
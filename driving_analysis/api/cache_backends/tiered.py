@@ -0,0 +1,79 @@
+import pickle
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .lru import LRUStore
+from .shared import SharedMemoryCache
+
+
+class TieredCache(BaseCache):
+    """
+    SharedMemoryCache with a small in-process LRU in front of it for hot keys.
+
+    Writes go to both tiers. Reads are answered by the process's LRU while
+    its copy is younger than ``LOCAL_TIMEOUT`` seconds and fall through to the
+    shared tier otherwise, so a value written by another process is seen
+    within ``LOCAL_TIMEOUT`` seconds. Misses are not kept locally.
+
+    LOCATION and OPTIONS are the shared tier's, plus:
+        LOCAL_MAX_ENTRIES (int): Entries kept per process (default 1000)
+        LOCAL_MAX_BYTES (int): Pickled bytes kept per process, no limit by default
+        LOCAL_TIMEOUT (float): Seconds a local copy is trusted (default 1.0)
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared = SharedMemoryCache(location, params)
+        self.local = LRUStore(int(options.get('LOCAL_MAX_ENTRIES', 1000)), options.get('LOCAL_MAX_BYTES'))
+        self.local_timeout = float(options.get('LOCAL_TIMEOUT', 1.0))
+
+    def _keep_local(self, key, pickled, expires):
+        local_expires = time.time() + self.local_timeout
+        self.local.set(key, pickled, local_expires if expires is None else min(expires, local_expires))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        expires = self.get_backend_timeout(timeout)
+        if not self.shared.add_entry(key, pickled, expires):
+            return False
+        self._keep_local(key, pickled, expires)
+        return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        pickled = self.local.get(key)
+        if pickled is None:
+            entry = self.shared.get_entry(key)
+            if entry is None:
+                return default
+            pickled, expires = entry
+            self._keep_local(key, pickled, expires)
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        expires = self.get_backend_timeout(timeout)
+        self.shared.set_entry(key, pickled, expires)
+        self._keep_local(key, pickled, expires)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self.local.delete(self.make_and_validate_key(key, version=version))
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(self.make_and_validate_key(key, version=version))
+        return self.shared.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self.local.get(key) is not None or self.shared.get_entry(key) is not None
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
@@ -1,23 +1,140 @@
+import re
+
 import pandas as pd
 import numpy as np
 
+# Time of day formats sent by the devices, most common first
+TIME_FORMATS = ('%H:%M:%S.%f', '%H:%M:%S', '%H:%M', '%I:%M %p')
+
+# Number of timestamps looked at to detect the formats of a batch
+TIME_FORMAT_SAMPLE_SIZE = 20
+
+# Numeric timestamps at or above this are epoch milliseconds, below it epoch seconds
+EPOCH_MILLIS_THRESHOLD = 1e11
+
+# Character positions of the firmware's fixed 'HH:MM:SS.mmm' clock layout
+_CLOCK_DIGITS = [0, 1, 3, 4, 6, 7, 9, 10, 11]
+_CLOCK_SEPARATORS = {2: ':', 5: ':', 8: '.'}
+_CLOCK_LENGTH = 12
+_NUMERIC_PATTERN = re.compile(r'\d+(\.\d+)?')
+
+
+def _parse_device_clock(text):
+    """
+    Decode ESP32 'HH:MM:SS.mmm' timestamps straight from their character codes.
+
+    Gives the same datetimes as the '%H:%M:%S.%f' format. Values that do not
+    have exactly this layout, or whose fields are out of range, are NaT and
+    left to the generic formats.
+
+    Args:
+        text (ndarray): Object array of strings ('' for missing values)
+    """
+    # Longer strings are truncated, which still leaves the last position set
+    chars = text.astype(f'U{_CLOCK_LENGTH + 1}')
+    codes = chars.view(np.uint32).reshape(len(chars), _CLOCK_LENGTH + 1).astype(np.int64)
+
+    digits = codes[:, _CLOCK_DIGITS] - ord('0')
+    valid = ((digits >= 0) & (digits <= 9)).all(axis=1) & (codes[:, _CLOCK_LENGTH] == 0)
+    for position, separator in _CLOCK_SEPARATORS.items():
+        valid &= codes[:, position] == ord(separator)
+
+    hours = digits[:, 0] * 10 + digits[:, 1]
+    minutes = digits[:, 2] * 10 + digits[:, 3]
+    seconds = digits[:, 4] * 10 + digits[:, 5]
+    millis = digits[:, 6] * 100 + digits[:, 7] * 10 + digits[:, 8]
+    valid &= (hours <= 23) & (minutes <= 59) & (seconds <= 59)
+
+    offsets = ((hours * 60 + minutes) * 60 + seconds) * 1000 + millis
+    parsed = np.datetime64('1900-01-01', 'ns') + offsets.astype('timedelta64[ms]')
+    return np.where(valid, parsed, np.datetime64('NaT'))
+
+
+def _parse_epoch(values):
+    """Unix epoch seconds or milliseconds to datetime64[ns], per value magnitude."""
+    values = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+    millis = values >= EPOCH_MILLIS_THRESHOLD
+    seconds = pd.to_datetime(np.where(millis, np.nan, values), unit='s', errors='coerce')
+    milliseconds = pd.to_datetime(np.where(millis, values, np.nan), unit='ms', errors='coerce')
+    return np.where(millis, milliseconds.to_numpy(), seconds.to_numpy()).astype('datetime64[ns]')
+
+
+def _parse_format(text, fmt):
+    return pd.to_datetime(text, format=fmt, errors='coerce').to_numpy().astype('datetime64[ns]')
+
+
+def _detect_formats(sample):
+    """TIME_FORMATS ordered by how many sample values they parse."""
+    hits = {}
+    for fmt in TIME_FORMATS:
+        hits[fmt] = int((~np.isnat(_parse_format(sample, fmt))).sum())
+        if hits[fmt] == len(sample):
+            break
+    return sorted(TIME_FORMATS, key=lambda fmt: -hits.get(fmt, 0))
+
+
+def parse_timestamps(values):
+    """
+    Parse a batch of device timestamps without a Python call per row.
+
+    ESP32 clock strings ('HH:MM:SS.mmm') and epoch seconds/milliseconds take
+    fast paths. Other formats are detected once from a sample of what is
+    left, and each format is applied with one vectorized ``to_datetime`` call
+    to the rows no earlier format could parse.
+
+    Args:
+        values (Series | array-like): Raw timestamps
+
+    Returns:
+        Series: datetime64 values, NaT where nothing matched
+    """
+    index = values.index if isinstance(values, pd.Series) else None
+    raw = np.asarray(values)
+    if raw.dtype.kind in 'iuf':
+        return pd.Series(_parse_epoch(raw), index=index)
+
+    raw = raw.astype(object)
+    parsed = np.full(len(raw), np.datetime64('NaT'), dtype='datetime64[ns]')
+    pending = np.fromiter((type(value) is str for value in raw), dtype=bool, count=len(raw))
+    text = np.where(pending, raw, '')
+    sample = text[pending][:TIME_FORMAT_SAMPLE_SIZE].tolist()
+
+    # ESP32 fast paths
+    if any(len(value) == _CLOCK_LENGTH for value in sample):
+        clock = _parse_device_clock(text)
+        matched = ~np.isnat(clock)
+        parsed[matched] = clock[matched]
+        pending &= ~matched
+    if any(_NUMERIC_PATTERN.fullmatch(value) for value in sample):
+        numeric = pending & np.fromiter(
+            (_NUMERIC_PATTERN.fullmatch(value) is not None for value in text), dtype=bool, count=len(text))
+        parsed[numeric] = _parse_epoch(text[numeric])
+        pending &= ~numeric
+
+    # Residual rows; the formats are mutually exclusive, so the order only affects speed
+    if pending.any():
+        residual = text[pending]
+        # Detecting the formats of a few rows costs as much as parsing them
+        formats = _detect_formats(residual[:TIME_FORMAT_SAMPLE_SIZE]) if len(residual) > TIME_FORMAT_SAMPLE_SIZE else TIME_FORMATS
+        for fmt in formats:
+            rows = np.flatnonzero(pending)
+            result = _parse_format(text[rows], fmt)
+            matched = ~np.isnat(result)
+            parsed[rows[matched]] = result[matched]
+            pending[rows[matched]] = False
+            if not pending.any():
+                break
+
+    return pd.Series(parsed, index=index)
+
+
 def cleanse_data(buffer):
     try:
         # Convert buffer to DataFrame
         data = pd.DataFrame(buffer)
 
         # Convert Time column with flexible format handling
-        def parse_time(x):
-            for fmt in ('%H:%M:%S.%f', '%H:%M:%S', '%H:%M', '%I:%M %p'):
-                try:
-                    return pd.to_datetime(x, format=fmt)
-                except ValueError:
-                    continue
-                except TypeError:
-                    return pd.NaT
-            return pd.NaT
-
-        data['timestamp'] = data['timestamp'].apply(parse_time)
+        data['timestamp'] = parse_timestamps(data['timestamp'])
 
         # Check for failed time conversions
         if data['timestamp'].isna().any():
@@ -0,0 +1,199 @@
+import logging
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .cleansing_data import parse_timestamps
+
+logger = logging.getLogger(__name__)
+
+# Sensor columns filled forward/backward over gaps
+SENSOR_COLUMNS = ('ax', 'ay', 'az', 'yaw')
+
+# Columns of the acceleration magnitude and the width of its median filter
+ACCEL_COLUMNS = ('ax', 'ay', 'az')
+MEDIAN_WINDOW = 5
+
+EARTH_RADIUS_KM = 6371.0
+
+
+class CleansedBatch:
+    """
+    Cleansed telemetry as a struct of arrays, in the column order of ``cleanse_data``.
+
+    Nothing is converted to pandas until ``to_dataframe`` or ``to_records``
+    is called, so callers that only need a few columns read them directly.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns['counter']) if 'counter' in self.columns else 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    @property
+    def empty(self):
+        return len(self) == 0
+
+    def to_dataframe(self):
+        """Same DataFrame as ``cleanse_data`` returns for the same input."""
+        return pd.DataFrame(self.columns)
+
+    def to_records(self):
+        """List of row dicts, like ``DataFrame.to_dict('records')`` with Timestamp values."""
+        values = []
+        for name, column in self.columns.items():
+            if np.issubdtype(column.dtype, np.datetime64):
+                values.append(list(pd.DatetimeIndex(column)))
+            else:
+                values.append(column.tolist())
+        names = list(self.columns)
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def _as_columns(buffer):
+    """Struct of arrays from a column dict (ring buffer window) or a list of row dicts."""
+    if isinstance(buffer, dict):
+        return {name: np.asarray(values) for name, values in buffer.items()}
+    frame = pd.DataFrame(buffer)
+    return {name: frame[name].to_numpy() for name in frame.columns}
+
+
+def _fill_gaps(values):
+    """``Series.ffill().bfill()`` on an array; only float columns can have gaps."""
+    if not np.issubdtype(values.dtype, np.floating):
+        return values
+    valid = ~np.isnan(values)
+    if valid.all() or not valid.any():
+        return values
+    positions = np.arange(len(values))
+    last_valid = np.maximum.accumulate(np.where(valid, positions, -1))
+    # Leading gaps take the first valid value
+    last_valid[last_valid < 0] = positions[valid][0]
+    return values[last_valid]
+
+
+def _first_occurrences(keys):
+    """Boolean mask keeping the first row of every distinct key (rows of a 1D or 2D array)."""
+    keep = np.zeros(len(keys), dtype=bool)
+    if len(keys):
+        _, first = np.unique(keys, axis=0, return_index=True)
+        keep[first] = True
+    return keep
+
+
+def _centered_median(values, window):
+    """``rolling(window, center=True).median().fillna(0)`` on a float array."""
+    result = np.zeros(len(values))
+    if len(values) >= window:
+        medians = np.median(sliding_window_view(values, window), axis=1)
+        result[window // 2:window // 2 + len(medians)] = medians
+    result[np.isnan(result)] = 0
+    return result
+
+
+def _segment_distances(latitude, longitude):
+    """Haversine distance in km from each point to the previous one (0 for the first)."""
+    lat = np.radians(latitude)
+    lon = np.radians(longitude)
+    distance = np.zeros(len(lat))
+    if len(lat) > 1:
+        dlat = lat[1:] - lat[:-1]
+        dlon = lon[1:] - lon[:-1]
+        a = np.sin(dlat / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlon / 2) ** 2
+        with np.errstate(invalid='ignore'):
+            c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+        distance[1:] = EARTH_RADIUS_KM * c
+    distance[~np.isfinite(distance)] = 0
+    return distance
+
+
+def cleanse_columns(buffer):
+    """
+    Array-backed version of ``cleanse_data``.
+
+    The same cleansing steps run on column arrays: each filter narrows an
+    index array, the final order is one permutation of it, and every column
+    is gathered exactly once at the end.
+
+    Args:
+        buffer (dict | list): Column name -> array (e.g. a drained ring buffer
+            window), or a list of row dicts
+
+    Returns:
+        CleansedBatch: Empty if the batch could not be processed (the error is logged)
+    """
+    try:
+        columns = _as_columns(buffer)
+        timestamps = parse_timestamps(pd.Series(columns['timestamp'])).to_numpy()
+
+        # Check for failed time conversions
+        valid = ~np.isnat(timestamps)
+        if not valid.all():
+            logger.warning(f"{(~valid).sum()} time values couldn't be parsed. Check time format.")
+
+        # 1. Remove invalid GPS coordinates
+        latitude = columns['latitude'].astype(np.float64)
+        longitude = columns['longitude'].astype(np.float64)
+        valid &= (latitude >= -90) & (latitude <= 90) & (longitude >= -180) & (longitude <= 180)
+        valid &= (latitude != 0) | (longitude != 0)
+        rows = np.flatnonzero(valid)
+
+        # 2. Fill sensor gaps over the remaining rows, 3. invert Ax
+        filled = {}
+        for name in SENSOR_COLUMNS:
+            if name in columns:
+                filled[name] = _fill_gaps(columns[name][rows])
+        if 'ax' in filled:
+            filled['ax'] = -filled['ax']
+
+        # 4. Clean speed data
+        if 'speed' in columns:
+            filled['speed'] = np.clip(columns['speed'][rows], 0, 200)
+
+        # 5. Remove duplicate timestamps, keeping the first occurrence
+        kept = np.flatnonzero(_first_occurrences(timestamps[rows].view(np.int64)))
+
+        # 6. Stationary points: keep only the first at each location, then order by time
+        if 'speed' in filled:
+            speed = filled['speed'][kept]
+            moving = speed > 0
+            stationary = np.flatnonzero(speed == 0)
+            first_stationary = _first_occurrences(
+                np.column_stack((latitude[rows][kept][stationary], longitude[rows][kept][stationary])))
+            keep = moving.copy()
+            keep[stationary[first_stationary]] = True
+            kept = kept[keep]
+            kept = kept[np.argsort(timestamps[rows][kept], kind='stable')]
+
+        # Gather every column once, in the order cleanse_data returns them
+        selection = rows[kept]
+        result = {'counter': np.arange(1, len(selection) + 1, dtype=np.int64)}
+        for name, column in columns.items():
+            if name == 'counter':
+                continue
+            if name == 'timestamp':
+                result[name] = timestamps[selection].astype('datetime64[ns]')
+            elif name in filled:
+                result[name] = filled[name][kept]
+            else:
+                result[name] = column[selection]
+
+        # Feature engineering
+        if all(name in result for name in ACCEL_COLUMNS):
+            smoothed = [_centered_median(result[name], MEDIAN_WINDOW) for name in ACCEL_COLUMNS]
+            result['acceleration_magnitude'] = np.sqrt(smoothed[0] ** 2 + smoothed[1] ** 2 + smoothed[2] ** 2)
+        result['distance'] = _segment_distances(result['latitude'], result['longitude'])
+
+        return CleansedBatch(result)
+
+    except Exception as e:
+        logger.exception(f"Cleansing failed: {e}")
+        return CleansedBatch({})
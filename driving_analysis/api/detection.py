@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+from .rolling import rolling_range, rolling_var
+
+# Integer label codes; strings are only produced by ``label_names``
+NORMAL = 0
+HARSH_BRAKING = 1
+HARSH_ACCELERATION = 2
+SWERVING = 3
+OVER_SPEED = 4
+LABELS = np.array(['Normal', 'Harsh Braking', 'Harsh Acceleration', 'Swerving', 'Over Speed'], dtype=object)
+
+# Detection parameters of analyze_data
+MAGNITUDE_WINDOW = 2
+AX_VARIANCE_WINDOW = 35
+SWERVE_WINDOW = 12
+RESET_WINDOW = 90
+SENSOR_LIMIT = 2000
+OVER_SPEED_LIMIT = 120
+SWERVING_MIN_SPEED = 30
+
+
+def compute_features(ax, yaw, magnitude):
+    """
+    Window features used by the detection rules.
+
+    Args:
+        ax, yaw, magnitude (ndarray): Float arrays of equal length; ``ax`` or
+            ``yaw`` may be None when the column is missing
+
+    Returns:
+        dict: Feature name -> float array (or None when its input is missing)
+    """
+    features = {
+        'magnitude_variance': rolling_var(magnitude, MAGNITUDE_WINDOW, min_periods=1),
+        'negative_ax_variance': None,
+        'positive_ax_variance': None,
+        'yaw_change': None,
+        'large_yaw_change': None,
+    }
+    if ax is not None:
+        features['negative_ax_variance'] = rolling_var(np.where(ax < 0, ax, np.nan), AX_VARIANCE_WINDOW, min_periods=1)
+        features['positive_ax_variance'] = rolling_var(np.where(ax > 0, ax, np.nan), AX_VARIANCE_WINDOW, min_periods=1)
+    if yaw is not None:
+        features['yaw_change'] = rolling_range(yaw, SWERVE_WINDOW, center=True, min_periods=1)
+        features['large_yaw_change'] = rolling_range(yaw, RESET_WINDOW, center=True, min_periods=1)
+    return features
+
+
+def variance_threshold(mean, std):
+    """Outlier threshold on a variance feature: mean + 1.5 std (std of 0 or NaN counts as 1)."""
+    return mean + 1.5 * (std if std > 0 else 1)
+
+
+def label_codes(ax, ay, speed, features, event_mask, braking_threshold, acceleration_threshold):
+    """
+    Fused labeling kernel: the label code of every sample in a single selection.
+
+    The sequence of label overwrites in analyze_data reduces to a fixed
+    priority, evaluated here in one ``np.select`` over the feature arrays:
+
+    1. over speed
+    2. variance-based swerving, acceleration and braking, when events were
+       detected and the large yaw window does not reset them
+    3. plain braking (Ax) and swerving (Ay) thresholds
+    Swerving below SWERVING_MIN_SPEED counts as normal driving.
+
+    Args:
+        ax, ay, speed (ndarray): Sample arrays; None when the column is missing
+        features (dict): Output of ``compute_features``
+        event_mask (ndarray): Samples whose magnitude variance marks an event
+        braking_threshold, acceleration_threshold (float): Variance thresholds;
+            None disables the variance-based rules (no events detected)
+
+    Returns:
+        ndarray: int8 label codes
+    """
+    n = len(event_mask)
+    never = np.zeros(n, dtype=bool)
+    with np.errstate(invalid='ignore'):
+        over_speed = speed > OVER_SPEED_LIMIT if speed is not None else never
+        slow = speed < SWERVING_MIN_SPEED if speed is not None else never
+        braking = ax < -SENSOR_LIMIT if ax is not None else never
+        accelerating = ax > SENSOR_LIMIT if ax is not None else never
+        lateral = np.abs(ay) > SENSOR_LIMIT if ay is not None else never
+
+        strong_braking = strong_acceleration = strong_swerving = never
+        if braking_threshold is not None:
+            if features['large_yaw_change'] is not None:
+                kept = ~(features['large_yaw_change'] > 40)
+            else:
+                kept = ~never
+            if ax is not None:
+                strong_braking = kept & (features['negative_ax_variance'] > braking_threshold) & braking
+                strong_acceleration = kept & (features['positive_ax_variance'] > acceleration_threshold) & accelerating
+            if ay is not None and features['yaw_change'] is not None:
+                yaw_change = features['yaw_change']
+                strong_swerving = kept & (yaw_change >= 4) & (yaw_change <= 12) & lateral
+
+    swerving_code = np.where(slow, NORMAL, SWERVING)
+    return np.select(
+        [over_speed, strong_swerving, strong_acceleration, strong_braking, braking, lateral],
+        [OVER_SPEED, swerving_code, HARSH_ACCELERATION, HARSH_BRAKING, HARSH_BRAKING, swerving_code],
+        default=NORMAL,
+    ).astype(np.int8)
+
+
+def count_events(codes, previous=NORMAL):
+    """
+    Event counts of a label code array.
+
+    Harsh braking counts runs of consecutive samples once; ``previous`` is the
+    code of the sample before ``codes`` (for chunked streams).
+    """
+    braking = codes == HARSH_BRAKING
+    starts = braking.copy()
+    if len(codes):
+        starts[0] = braking[0] and previous != HARSH_BRAKING
+        starts[1:] &= ~braking[:-1]
+    return {
+        'harsh_braking_events': int(starts.sum()),
+        'harsh_acceleration_events': int((codes == HARSH_ACCELERATION).sum()),
+        'swerving_events': int((codes == SWERVING).sum()),
+        'over_speed_events': int((codes == OVER_SPEED).sum()),
+    }
+
+
+def label_names(codes):
+    """Label strings of a code array, for API responses."""
+    return LABELS[codes].tolist()
+
+
+def _column(df, name):
+    return df[name].to_numpy(dtype=np.float64) if name in df.columns else None
+
+
+def detect(df):
+    """
+    Run the whole detection on a DataFrame with analyze_data's column names.
+
+    Returns:
+        tuple: (int8 label codes, number of detected magnitude events)
+    """
+    ax, ay, yaw = _column(df, 'Ax'), _column(df, 'Ay'), _column(df, 'Yaw')
+    speed = _column(df, 'Speed(km/h)')
+    if 'acceleration_magnitude' in df.columns:
+        magnitude = _column(df, 'acceleration_magnitude')
+    else:
+        magnitude = np.sqrt(_column(df, 'Ax') ** 2 + _column(df, 'Ay') ** 2 + _column(df, 'Az') ** 2)
+
+    features = compute_features(ax, yaw, magnitude)
+    event_mask = features['magnitude_variance'] > np.nanmean(magnitude)
+    detected_events = int(event_mask.sum())
+
+    braking_threshold = acceleration_threshold = None
+    if detected_events > 0 and ax is not None:
+        # pandas' mean/std skip NaN; std is sample std (ddof=1)
+        negative = pd.Series(features['negative_ax_variance'])
+        positive = pd.Series(features['positive_ax_variance'])
+        braking_threshold = variance_threshold(negative.mean(), negative.std())
+        acceleration_threshold = variance_threshold(positive.mean(), positive.std())
+    elif detected_events > 0:
+        braking_threshold = acceleration_threshold = np.nan
+
+    codes = label_codes(ax, ay, speed, features, event_mask, braking_threshold, acceleration_threshold)
+    return codes, detected_events
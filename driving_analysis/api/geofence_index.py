@@ -0,0 +1,316 @@
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371000
+
+# Meters per degree of latitude, used for the bounding box of circles
+METERS_PER_DEGREE = 111320
+
+# Shared cache key changed whenever a geofence changes, so every process rebuilds its index
+GENERATION_KEY = 'geofence_index_generation'
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters; arguments broadcast like NumPy arrays."""
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = np.radians(lat2 - lat1)
+    dlambda = np.radians(lon2 - lon1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return EARTH_RADIUS_M * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def _edge_crossings(y, x, p1y, p2y, p1x, p2x):
+    """Points (rows) x edges (columns) matrix of ray-casting crossings."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xinters = (y - p1y) * (p2x - p1x) / (p2y - p1y + 1e-10) + p1x
+    return (
+        (np.minimum(p1y, p2y) < y) & (y <= np.maximum(p1y, p2y))
+        & (x <= np.maximum(p1x, p2x))
+        & ((p1x == p2x) | (x <= xinters))
+    )
+
+
+def points_in_polygon(lat, lon, polygon_lat, polygon_lon):
+    """
+    Ray-casting test of points against one polygon, all edges at once.
+
+    A point is inside when a ray towards +longitude crosses an odd number of
+    edges; edges are counted when the point's latitude is above their lower
+    end and at most their upper end.
+
+    Args:
+        lat, lon (ndarray): Points, shape (N,)
+        polygon_lat, polygon_lon (ndarray): Vertices in order, shape (V,)
+
+    Returns:
+        ndarray: bool, shape (N,)
+    """
+    y = np.asarray(lat, dtype=np.float64)[:, None]
+    x = np.asarray(lon, dtype=np.float64)[:, None]
+    # Edge i goes from vertex i-1 to vertex i, closing the ring
+    crossing = _edge_crossings(y, x, np.roll(polygon_lat, 1), polygon_lat, np.roll(polygon_lon, 1), polygon_lon)
+    return crossing.sum(axis=1) % 2 == 1
+
+
+class CompiledFence:
+    """An active geofence with its geometry parsed into arrays and its bounding box."""
+
+    __slots__ = ('id', 'type', 'center', 'radius', 'polygon_lat', 'polygon_lon', 'bbox')
+
+    def __init__(self, geofence):
+        coords = json.loads(geofence.coordinates_json)
+        self.id = geofence.id
+        self.type = geofence.type
+        self.center = self.radius = self.polygon_lat = self.polygon_lon = None
+        if geofence.type == 'circle':
+            self.center = (float(coords[0]), float(coords[1]))
+            self.radius = float(geofence.radius)
+            # Padded so that rounding can't put a point inside the circle outside its box
+            dlat = self.radius / METERS_PER_DEGREE * 1.01 + 1e-9
+            dlon = dlat / max(np.cos(np.radians(self.center[0])), 1e-6)
+            self.bbox = (self.center[0] - dlat, self.center[0] + dlat, self.center[1] - dlon, self.center[1] + dlon)
+        else:
+            vertices = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+            self.polygon_lat = vertices[:, 0].copy()
+            self.polygon_lon = vertices[:, 1].copy()
+            self.bbox = (self.polygon_lat.min(), self.polygon_lat.max(),
+                         self.polygon_lon.min(), self.polygon_lon.max())
+
+    def contains(self, lat, lon):
+        """Exact test of arrays of points."""
+        if self.type == 'circle':
+            return haversine_m(lat, lon, self.center[0], self.center[1]) <= self.radius
+        return points_in_polygon(lat, lon, self.polygon_lat, self.polygon_lon)
+
+
+class FenceSet:
+    """
+    The active fences of one owner, stacked for vectorized tests.
+
+    Bounding boxes are one (M, 4) array; the edges of all polygons are
+    concatenated polygon after polygon, and circles are center and radius
+    arrays, so N points are tested against every fence in one pass.
+    """
+
+    # Points x edges cells evaluated at once, to bound memory on long traces
+    MAX_CELLS = 1_000_000
+
+    def __init__(self, fences):
+        self.fences = fences
+        self.bboxes = np.array([fence.bbox for fence in fences], dtype=np.float64).reshape(-1, 4)
+
+        polygons = [fence for fence in fences if fence.type != 'circle']
+        circles = [fence for fence in fences if fence.type == 'circle']
+        self.polygon_columns = np.array([i for i, fence in enumerate(fences) if fence.type != 'circle'], dtype=np.intp)
+        self.circle_columns = np.array([i for i, fence in enumerate(fences) if fence.type == 'circle'], dtype=np.intp)
+        self.edge_count = sum(len(fence.polygon_lat) for fence in polygons)
+        if polygons:
+            self.p2y = np.concatenate([fence.polygon_lat for fence in polygons])
+            self.p2x = np.concatenate([fence.polygon_lon for fence in polygons])
+            self.p1y = np.concatenate([np.roll(fence.polygon_lat, 1) for fence in polygons])
+            self.p1x = np.concatenate([np.roll(fence.polygon_lon, 1) for fence in polygons])
+            # First edge of each polygon, for np.add.reduceat
+            self.edge_starts = np.cumsum([0] + [len(fence.polygon_lat) for fence in polygons[:-1]])
+        self.center_lat = np.array([fence.center[0] for fence in circles], dtype=np.float64)
+        self.center_lon = np.array([fence.center[1] for fence in circles], dtype=np.float64)
+        self.radius = np.array([fence.radius for fence in circles], dtype=np.float64)
+
+    def candidates(self, lat, lon):
+        """Fences whose bounding box holds the point."""
+        b = self.bboxes
+        hit = (b[:, 0] <= lat) & (lat <= b[:, 1]) & (b[:, 2] <= lon) & (lon <= b[:, 3])
+        return [self.fences[i] for i in np.flatnonzero(hit)]
+
+    def contains_many(self, lat, lon):
+        """
+        Exact containment of N points in each of the M fences.
+
+        Only the points inside at least one bounding box are tested exactly.
+
+        Returns:
+            ndarray: bool, shape (N, M)
+        """
+        b = self.bboxes
+        y, x = lat[:, None], lon[:, None]
+        in_box = (b[:, 0] <= y) & (y <= b[:, 1]) & (b[:, 2] <= x) & (x <= b[:, 3])
+        inside = np.zeros(in_box.shape, dtype=bool)
+        rows = np.flatnonzero(in_box.any(axis=1))
+        chunk = max(1, self.MAX_CELLS // max(self.edge_count, len(self.circle_columns), 1))
+        for start in range(0, len(rows), chunk):
+            part = rows[start:start + chunk]
+            py, px = lat[part][:, None], lon[part][:, None]
+            if len(self.polygon_columns):
+                crossings = _edge_crossings(py, px, self.p1y, self.p2y, self.p1x, self.p2x)
+                parity = np.add.reduceat(crossings.astype(np.int32), self.edge_starts, axis=1) % 2 == 1
+                inside[part[:, None], self.polygon_columns] = parity
+            if len(self.circle_columns):
+                distance = haversine_m(py, px, self.center_lat, self.center_lon)
+                inside[part[:, None], self.circle_columns] = distance <= self.radius
+        return inside & in_box
+
+
+class GeofenceIndex:
+    """
+    In-process index of the active geofences, keyed by owner.
+
+    Built from one query on first use and rebuilt lazily after ``invalidate``,
+    which the Geofence save/delete signals call; other processes notice the
+    change through a shared generation key checked at most once per
+    ``check_interval`` seconds.
+    """
+
+    def __init__(self, check_interval=1.0):
+        self.check_interval = check_interval
+        self._owners = None
+        self._lock = threading.Lock()
+        self._generation = None
+        self._last_check = 0.0
+
+    def _build(self):
+        from .models import Geofence
+
+        grouped = {}
+        for geofence in Geofence.objects.filter(active=True):
+            try:
+                fence = CompiledFence(geofence)
+            except (ValueError, TypeError, IndexError) as e:
+                logger.warning(f"Skipping geofence {geofence.id} with invalid geometry: {e}")
+                continue
+            if geofence.company_id_id is not None:
+                grouped.setdefault(('company', geofence.company_id_id), []).append(fence)
+            if geofence.customer_id_id is not None:
+                grouped.setdefault(('customer', geofence.customer_id_id), []).append(fence)
+        return {owner: FenceSet(fences) for owner, fences in grouped.items()}
+
+    def _check_generation(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        generation = cache.get(GENERATION_KEY)
+        if generation != self._generation:
+            with self._lock:
+                self._owners = None
+            self._generation = generation
+
+    def generation(self):
+        """Value that changes whenever a geofence changes."""
+        self._check_generation()
+        return self._generation
+
+    def owners(self):
+        self._check_generation()
+        owners = self._owners
+        if owners is None:
+            with self._lock:
+                if self._owners is None:
+                    self._owners = self._build()
+                owners = self._owners
+        return owners
+
+    def fence_sets(self, company_id, customer_id):
+        """FenceSets that apply to a car of this company and customer."""
+        owners = self.owners()
+        sets = []
+        if company_id is not None and ('company', company_id) in owners:
+            sets.append(owners[('company', company_id)])
+        if customer_id is not None and ('customer', customer_id) in owners:
+            sets.append(owners[('customer', customer_id)])
+        return sets
+
+    def inside_any(self, company_id, customer_id, lat, lon):
+        """
+        Whether a point is inside any active fence of the car's company or customer.
+
+        Returns:
+            bool | None: None when no active fence applies
+        """
+        sets = self.fence_sets(company_id, customer_id)
+        if not sets:
+            return None
+        point_lat = np.array([lat], dtype=np.float64)
+        point_lon = np.array([lon], dtype=np.float64)
+        for fence_set in sets:
+            for fence in fence_set.candidates(lat, lon):
+                if fence.contains(point_lat, point_lon)[0]:
+                    return True
+        return False
+
+    def inside_many(self, company_id, customer_id, lat, lon):
+        """
+        ``inside_any`` for a whole trace of points of one car.
+
+        Returns:
+            ndarray | None: bool per point, or None when no active fence applies
+        """
+        sets = self.fence_sets(company_id, customer_id)
+        if not sets:
+            return None
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        inside = np.zeros(len(lat), dtype=bool)
+        for fence_set in sets:
+            inside |= fence_set.contains_many(lat, lon).any(axis=1)
+        return inside
+
+    def inside_fleet(self, owners, lat, lon):
+        """
+        ``inside_any`` for one point per car, evaluated per owner in batches.
+
+        Args:
+            owners (list): (company_id, customer_id) of each point's car
+            lat, lon (array-like): Points
+
+        Returns:
+            list: True/False per point, None where no active fence applies
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        groups = {}
+        for i, owner in enumerate(owners):
+            groups.setdefault(owner, []).append(i)
+        result = [None] * len(owners)
+        for (company_id, customer_id), rows in groups.items():
+            inside = self.inside_many(company_id, customer_id, lat[rows], lon[rows])
+            if inside is not None:
+                for row, value in zip(rows, inside.tolist()):
+                    result[row] = value
+        return result
+
+    def exits(self, company_id, customer_id, lat, lon, was_inside=None):
+        """
+        Samples of a trace where the car leaves all of its fences.
+
+        Args:
+            lat, lon (array-like): Consecutive positions of one car
+            was_inside (bool): State before the first sample (None if unknown)
+
+        Returns:
+            tuple: (indices of the exit samples, inside state after the last
+            sample or None when no active fence applies)
+        """
+        inside = self.inside_many(company_id, customer_id, lat, lon)
+        if inside is None or not len(inside):
+            return np.array([], dtype=np.intp), None if inside is None else was_inside
+        previous = np.empty_like(inside)
+        previous[0] = bool(was_inside)
+        previous[1:] = inside[:-1]
+        return np.flatnonzero(previous & ~inside), bool(inside[-1])
+
+    def invalidate(self):
+        """Rebuild the index here and in every other process on next use."""
+        with self._lock:
+            self._owners = None
+        self._generation = time.time_ns()
+        cache.set(GENERATION_KEY, self._generation, timeout=None)
+
+
+geofence_index = GeofenceIndex()
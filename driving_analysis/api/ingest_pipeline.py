@@ -0,0 +1,456 @@
+import logging
+import queue
+import threading
+import time
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from .bulk_writer import DrivingDataWriter
+from .geofence_index import geofence_index
+from .live_feed import share_event
+from .location_store import latest_positions
+from .ring_buffer import device_buffers
+from .streaming_analysis import StreamingAnalyzer
+from .telemetry_parser import parse_payload
+
+logger = logging.getLogger('mqtt_client')
+
+# Marks the end of a queue when the pipeline stops
+_STOP = object()
+
+
+class StageMetrics:
+    """Thread-safe counters for one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.busy_seconds = 0.0
+
+    def record(self, count=1, lag=0.0, elapsed=0.0):
+        with self._lock:
+            self.processed += count
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self.busy_seconds += elapsed
+
+    def record_drop(self, count=1):
+        with self._lock:
+            self.dropped += count
+
+    def record_error(self, count=1):
+        with self._lock:
+            self.errors += count
+
+    def snapshot(self, depth=None):
+        with self._lock:
+            data = {
+                'processed': self.processed,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'last_lag_ms': round(self.last_lag * 1000, 1),
+                'max_lag_ms': round(self.max_lag * 1000, 1),
+                'busy_seconds': round(self.busy_seconds, 3),
+            }
+        if depth is not None:
+            data['queue_depth'] = depth
+        return data
+
+
+def analyze_window(device_name, window, analyzer=None):
+    """
+    Cleanse and analyze one full telemetry window of a single device.
+
+    Args:
+        device_name (str): Device the window belongs to
+        window (dict): Column arrays drained from the device's ring buffer
+        analyzer (StreamingAnalyzer): The device's streaming analyzer; when
+            given, events are counted across window boundaries instead of
+            analyzing the window on its own
+
+    Returns:
+        dict: DrivingData field values plus 'device_name' and the cleansed
+        'positions' (latitude and longitude arrays), or None if nothing
+        survived cleansing
+    """
+    # Cleansing, on the window's column arrays
+    from .columnar_cleansing import cleanse_columns
+    cleansed = cleanse_columns(window)
+    if cleansed.empty:
+        logger.warning(f"No data left after cleansing window of device {device_name}")
+        return None
+
+    # Latest cleansed window, for get_cleansed_data; replaced rather than
+    # extended so the cached value stays one window long
+    cache.set('cleansed_buffer', cleansed.to_records(), timeout=None)
+
+    # The analysis works on a DataFrame
+    cleaned_data = cleansed.to_dataframe()
+
+    # Analysis
+    if analyzer is None:
+        from .analysis import analyze_data
+        analysis_results = analyze_data(cleaned_data)
+    else:
+        from .views import score_chunk
+        analysis_results = analyzer.feed(cleaned_data)
+        analysis_results['score'] = score_chunk(None, analysis_results)
+    cache.set('analysis_results', analysis_results, timeout=None)
+
+    return {
+        'device_name': device_name,
+        'positions': (cleansed['latitude'], cleansed['longitude']),
+        'speed': float(cleansed['speed'].mean()),
+        'distance': analysis_results.get('distance_km', 0.1),
+        'harsh_braking_events': analysis_results.get('harsh_braking_events', 0),
+        'harsh_acceleration_events': analysis_results.get('harsh_acceleration_events', 0),
+        'swerving_events': analysis_results.get('swerving_events', 0),
+        'potential_swerving_events': analysis_results.get('potential_swerving_events', 0),
+        'over_speed_events': analysis_results.get('over_speed_events', 0),
+        'score': analysis_results.get('score', 100),
+        # Flag the window if any of its lines reported an accident
+        'accident_detection': bool(window['accident'].any()),
+    }
+
+
+def flush_analyzer(device_name, analyzer):
+    """
+    Label the samples a device's streaming analyzer still holds back.
+
+    Returns:
+        dict: DrivingData field values of those samples, as ``analyze_window``
+        returns them (without positions), or None if nothing was pending
+    """
+    pending = analyzer.pending()
+    if pending is None or pending.empty:
+        return None
+    from .views import score_chunk
+    analysis_results = analyzer.flush()
+    return {
+        'device_name': device_name,
+        'speed': float(pending['Speed(km/h)'].mean()),
+        'distance': analysis_results['distance_km'],
+        'harsh_braking_events': analysis_results['harsh_braking_events'],
+        'harsh_acceleration_events': analysis_results['harsh_acceleration_events'],
+        'swerving_events': analysis_results['swerving_events'],
+        'potential_swerving_events': analysis_results['potential_swerving_events'],
+        'over_speed_events': analysis_results['over_speed_events'],
+        'score': score_chunk(None, analysis_results),
+        # Accidents were flagged with the windows that reported them
+        'accident_detection': False,
+    }
+
+
+class IngestPipeline:
+    """
+    Staged MQTT ingest: parse -> bounded queues -> analysis workers -> batched DB writer.
+
+    ``submit_payload`` runs on the MQTT callback thread and only parses the
+    payload and fills the per-device ring buffers. Full windows are handed to
+    a pool of analysis workers through bounded queues, sharded by device so
+    each device's windows are processed in order. Results are written to the
+    database in batches by a single writer thread.
+
+    When an analysis queue is full, a window waits at most ``put_timeout``
+    seconds and is then dropped and counted, so message receipt never blocks
+    on analysis or the database.
+
+    Latest positions go to ``positions`` and lines are buffered in
+    ``buffers``, by default the process-wide ``latest_positions`` (which the
+    views read) and ``device_buffers``.
+    """
+
+    def __init__(self, workers=None, queue_size=None, put_timeout=None,
+                 write_batch_size=None, write_interval=None, metrics_interval=None,
+                 positions=None, buffers=None):
+        self.workers = workers or getattr(settings, 'INGEST_WORKERS', 2)
+        self.queue_size = queue_size or getattr(settings, 'INGEST_QUEUE_SIZE', 100)
+        self.put_timeout = put_timeout if put_timeout is not None else getattr(settings, 'INGEST_QUEUE_TIMEOUT', 0)
+        self.write_batch_size = write_batch_size or getattr(settings, 'INGEST_WRITE_BATCH_SIZE', 50)
+        self.write_interval = write_interval or getattr(settings, 'INGEST_WRITE_INTERVAL', 1.0)
+        self.metrics_interval = metrics_interval or getattr(settings, 'INGEST_METRICS_INTERVAL', 60)
+        self.positions = positions if positions is not None else latest_positions
+        self.buffers = buffers if buffers is not None else device_buffers
+
+        self._analysis_queues = [queue.Queue(maxsize=self.queue_size) for _ in range(self.workers)]
+        self._write_queue = queue.Queue(maxsize=self.queue_size * self.workers)
+        self._threads = []
+        self._running = False
+
+        self.receive_metrics = StageMetrics('receive')
+        self.analysis_metrics = StageMetrics('analysis')
+        self.write_metrics = StageMetrics('write')
+        self._malformed_lines = 0
+        self._car_ids = {}
+        self._car_owners = {}
+        # Per-device inside/outside state after the last checked sample, used by the writer thread only
+        self._geofence_inside = {}
+        self._geofence_exits = 0
+
+        # Per-device streaming analyzers; each is only used by its device's shard
+        self.streaming = getattr(settings, 'INGEST_STREAMING_ANALYSIS', False)
+        self._analyzers = {}
+
+    # ---- lifecycle --------------------------------------------------------
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        for shard in range(self.workers):
+            thread = threading.Thread(target=self._analysis_loop, args=(shard,),
+                                      name=f'ingest-analysis-{shard}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        writer = threading.Thread(target=self._write_loop, name='ingest-writer', daemon=True)
+        writer.start()
+        self._threads.append(writer)
+        logger.info(f"Ingest pipeline started with {self.workers} analysis workers")
+
+    def stop(self, timeout=30):
+        """
+        Stop accepting work, let queued windows finish and flush the writer.
+
+        The partial windows left in the device ring buffers are analyzed as
+        well, then the samples the streaming analyzers still hold back for
+        their lookahead are labeled and written as a last row per device.
+        Call it once the MQTT loop has stopped, so no payload arrives meanwhile.
+        """
+        if not self._running:
+            return
+        self._running = False
+        for analysis_queue in self._analysis_queues:
+            analysis_queue.put(_STOP)
+        for thread in self._threads[:-1]:
+            thread.join(timeout)
+        self._drain_buffers()
+        self._flush_analyzers()
+        self._write_queue.put(_STOP)
+        self._threads[-1].join(timeout)
+        self._threads = []
+        self.positions.snapshot()
+        logger.info(f"Ingest pipeline stopped: {self.metrics()}")
+
+    # ---- stage 1: receive and parse ---------------------------------------
+
+    def submit_payload(self, payload):
+        """Parse one MQTT payload and queue every device window that fills up."""
+        started = time.monotonic()
+        batch = parse_payload(payload)
+        if batch.malformed_count:
+            self._malformed_lines += batch.malformed_count
+            logger.warning(f"Skipped {batch.malformed_count} malformed lines in message: {batch.malformed}")
+        if not len(batch):
+            return
+
+        self._store_latest_positions(batch)
+
+        # Copy each device's lines into its in-process ring buffer
+        for device_name in batch.device_names():
+            device_columns = batch.for_device(device_name)
+            device_buffer = self.buffers.get(device_name)
+            offset = 0
+            while offset < len(device_columns['timestamp']):
+                offset += device_buffer.extend(device_columns, offset)
+                if device_buffer.is_full():
+                    logger.info(f"Buffer for {device_name} reached {device_buffer.capacity} data points - queueing for analysis")
+                    self.submit_window(device_name, device_buffer.drain())
+
+        self.receive_metrics.record(len(batch), elapsed=time.monotonic() - started)
+
+    def submit_window(self, device_name, window):
+        """
+        Queue a drained window for analysis.
+
+        Returns:
+            bool: False if the window was dropped because its queue stayed full
+        """
+        shard = zlib.crc32(device_name.encode()) % self.workers
+        item = (device_name, window, time.monotonic())
+        try:
+            if self.put_timeout:
+                self._analysis_queues[shard].put(item, timeout=self.put_timeout)
+            else:
+                self._analysis_queues[shard].put_nowait(item)
+            return True
+        except queue.Full:
+            self.analysis_metrics.record_drop()
+            logger.warning(f"Analysis queue {shard} full, dropped window of device {device_name}")
+            return False
+
+    def _store_latest_positions(self, batch):
+        columns = batch.columns
+        latest = batch.latest_per_device()
+        rows = list(latest.values())
+        self.positions.update_many(
+            list(latest),
+            columns['latitude'][rows],
+            columns['longitude'][rows],
+            columns['speed'][rows],
+        )
+
+    # ---- stage 2: cleansing and analysis ----------------------------------
+
+    def _analysis_loop(self, shard):
+        analysis_queue = self._analysis_queues[shard]
+        while True:
+            item = analysis_queue.get()
+            if item is _STOP:
+                break
+            device_name, window, enqueued_at = item
+            started = time.monotonic()
+            try:
+                close_old_connections()
+                analyzer = self._analyzer_for(device_name) if self.streaming else None
+                row = analyze_window(device_name, window, analyzer)
+                if row is not None:
+                    # Blocking here pushes back on the analysis queues instead of losing results
+                    self._write_queue.put((row, time.monotonic()))
+                self.analysis_metrics.record(lag=started - enqueued_at, elapsed=time.monotonic() - started)
+            except Exception as e:
+                self.analysis_metrics.record_error()
+                logger.exception(f"Error analyzing window of device {device_name}: {e}")
+        close_old_connections()
+
+    def _analyzer_for(self, device_name):
+        analyzer = self._analyzers.get(device_name)
+        if analyzer is None:
+            analyzer = self._analyzers[device_name] = StreamingAnalyzer(device_name)
+        return analyzer
+
+    def _drain_buffers(self):
+        """Analyze the partial window of every device, on the calling thread."""
+        for device_name in self.buffers.device_names():
+            device_buffer = self.buffers.get(device_name)
+            if not len(device_buffer):
+                continue
+            try:
+                analyzer = self._analyzer_for(device_name) if self.streaming else None
+                row = analyze_window(device_name, device_buffer.drain(), analyzer)
+                if row is not None:
+                    self._write_queue.put((row, time.monotonic()))
+            except Exception as e:
+                self.analysis_metrics.record_error()
+                logger.exception(f"Error analyzing the partial window of device {device_name}: {e}")
+
+    def _flush_analyzers(self):
+        for device_name, analyzer in list(self._analyzers.items()):
+            try:
+                row = flush_analyzer(device_name, analyzer)
+                if row is not None:
+                    self._write_queue.put((row, time.monotonic()))
+            except Exception as e:
+                self.analysis_metrics.record_error()
+                logger.exception(f"Error flushing the analysis of device {device_name}: {e}")
+        self._analyzers.clear()
+
+    # ---- stage 3: batched database writes ---------------------------------
+
+    def _write_loop(self):
+        writer = DrivingDataWriter(
+            batch_size=self.write_batch_size,
+            flush_interval_ms=self.write_interval * 1000,
+            on_flush=lambda rows, elapsed, wait: self.write_metrics.record(rows, lag=wait, elapsed=elapsed),
+            on_drop=self.write_metrics.record_drop,
+        )
+        last_metrics_log = time.monotonic()
+        stopping = False
+        while not stopping:
+            timeout = writer.seconds_until_due()
+            try:
+                item = self._write_queue.get(timeout=self.write_interval if timeout is None else timeout)
+                if item is _STOP:
+                    stopping = True
+                else:
+                    self._add_row(writer, item[0])
+            except queue.Empty:
+                pass
+
+            try:
+                close_old_connections()
+                if stopping:
+                    writer.close()
+                else:
+                    writer.flush_if_due()
+            except Exception as e:
+                self.write_metrics.record_error()
+                logger.exception(f"Error writing driving data rows: {e}")
+
+            # Persist positions even when no new messages arrive
+            self.positions.snapshot_if_due()
+
+            now = time.monotonic()
+            if now - last_metrics_log >= self.metrics_interval:
+                logger.info(f"Ingest pipeline metrics: {self.metrics()}")
+                last_metrics_log = now
+        close_old_connections()
+
+    def _add_row(self, writer, row):
+        fields = dict(row)
+        device_name = fields.pop('device_name')
+        positions = fields.pop('positions', None)
+        car_id = self._resolve_car(device_name)
+        if car_id is None:
+            self.write_metrics.record_drop()
+            logger.warning(f"No car found with device_id {device_name}, window not saved")
+            return
+        try:
+            writer.add(car_id_id=car_id, **fields)
+        except Exception as e:
+            self.write_metrics.record_error()
+            logger.exception(f"Error writing driving data rows: {e}")
+        if fields.get('accident_detection'):
+            share_event(device_name, 'accident', score=fields.get('score'))
+        if positions is not None:
+            try:
+                self._check_geofences(device_name, *positions)
+            except Exception as e:
+                logger.exception(f"Error checking geofences of device {device_name}: {e}")
+
+    def _check_geofences(self, device_name, latitude, longitude):
+        """Flag every sample of the window where the car leaves its geofences."""
+        company_id, customer_id = self._car_owners[device_name]
+        exits, inside = geofence_index.exits(company_id, customer_id, latitude, longitude,
+                                             was_inside=self._geofence_inside.get(device_name))
+        self._geofence_inside[device_name] = inside
+        self._geofence_exits += len(exits)
+        for i in exits:
+            logger.warning(f"GEOFENCE EXIT: device {device_name} left its geofences at "
+                           f"({latitude[i]:.6f}, {longitude[i]:.6f})")
+            share_event(device_name, 'geofence_exit', latitude=float(latitude[i]), longitude=float(longitude[i]))
+
+    def _resolve_car(self, device_name):
+        """Car id of a device; known devices are cached, unknown ones are looked up again next time."""
+        car_id = self._car_ids.get(device_name)
+        if car_id is None:
+            from .models import Car
+            close_old_connections()
+            car = Car.objects.filter(device_id=device_name).values_list('id', 'company_id', 'customer_id').first()
+            if car is not None:
+                car_id = self._car_ids[device_name] = car[0]
+                self._car_owners[device_name] = car[1:]
+        return car_id
+
+    # ---- monitoring -------------------------------------------------------
+
+    def metrics(self):
+        """Per-stage counters, queue depths and lags."""
+        receive = self.receive_metrics.snapshot()
+        receive['malformed_lines'] = self._malformed_lines
+        receive['buffered_lines'] = sum(self.buffers.sizes().values())
+        write = self.write_metrics.snapshot(depth=self._write_queue.qsize())
+        write['geofence_exits'] = self._geofence_exits
+        return {
+            'receive': receive,
+            'analysis': self.analysis_metrics.snapshot(
+                depth=sum(q.qsize() for q in self._analysis_queues)),
+            'write': write,
+        }
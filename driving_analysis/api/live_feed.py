@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .location_store import latest_positions
+
+logger = logging.getLogger(__name__)
+
+# Shared cache key of the recent live events (geofence exits, accidents) published by ingest
+EVENTS_KEY = 'live_feed_events'
+
+# Events kept in the journal; a relay that falls further behind skips the oldest
+EVENTS_KEPT = 500
+
+_event_lock = threading.Lock()
+_last_event_seq = 0
+
+
+def share_event(device_id, event_type, **data):
+    """
+    Publish a live event of a device to every process's subscribers.
+
+    Appended to a bounded journal in the shared cache, which the relay of each
+    web process forwards to its broker. Meant for rare events: positions are
+    shared through the latest-position snapshot instead.
+    """
+    global _last_event_seq
+    with _event_lock:
+        # Microseconds, increasing across restarts and within one
+        _last_event_seq = max(_last_event_seq + 1, time.time_ns() // 1000)
+        event = {'type': event_type, 'device_id': device_id, 'seq': _last_event_seq, **data}
+        events = cache.get(EVENTS_KEY, [])
+        events.append(event)
+        cache.set(EVENTS_KEY, events[-EVENTS_KEPT:], timeout=None)
+    return event
+
+
+class Subscription:
+    """
+    One live client: the devices it may see and its pending updates.
+
+    Positions are coalesced per device (only the latest is kept until the
+    next batch), events are all delivered. The client's coroutine waits on an
+    asyncio.Event, so an idle subscription costs nothing until an update for
+    one of its devices arrives.
+    """
+
+    def __init__(self, device_ids, min_interval, loop):
+        self.device_ids = frozenset(device_ids)
+        self.min_interval = min_interval
+        self._loop = loop
+        self._wake = asyncio.Event()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_sent = 0.0
+
+    def offer(self, key, message):
+        """Queue an update; thread-safe, called from the broker's publishers."""
+        with self._lock:
+            first = not self._pending
+            self._pending[key] = message
+        if first:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def next_batch(self, timeout=None):
+        """
+        Wait for the next updates, at most one batch per ``min_interval``.
+
+        Returns:
+            list: Update messages, empty when ``timeout`` seconds passed without any
+        """
+        deadline = None if timeout is None else self._loop.time() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - self._loop.time()
+            try:
+                await asyncio.wait_for(self._wake.wait(), remaining)
+            except asyncio.TimeoutError:
+                return []
+            # Let updates accumulate until the client's rate allows the next batch
+            delay = self._last_sent + self.min_interval - self._loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            with self._lock:
+                batch = list(self._pending.values())
+                self._pending.clear()
+                self._wake.clear()
+            if batch:
+                self._last_sent = self._loop.time()
+                return batch
+
+
+class LiveBroker:
+    """
+    In-process publish/subscribe of live updates, filtered by device.
+
+    Subscribers are indexed by device_id, so publishing costs only as much as
+    the number of clients that may see the device.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_device = {}
+        self._subscriptions = set()
+
+    def subscribe(self, device_ids, min_interval=0.0, loop=None):
+        subscription = Subscription(device_ids, min_interval, loop or asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.add(subscription)
+            for device_id in subscription.device_ids:
+                self._by_device.setdefault(device_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            for device_id in subscription.device_ids:
+                subscribers = self._by_device.get(device_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._by_device[device_id]
+
+    def has_subscribers(self):
+        return bool(self._subscriptions)
+
+    def publish(self, device_id, key, message):
+        with self._lock:
+            subscribers = tuple(self._by_device.get(device_id, ()))
+        for subscription in subscribers:
+            subscription.offer(key, message)
+
+    def publish_positions(self, positions):
+        """Publish position dicts (device_id -> position), coalesced per device."""
+        for device_id, position in positions.items():
+            self.publish(device_id, ('position', device_id), {'type': 'position', **position})
+
+    def publish_event(self, event):
+        self.publish(event['device_id'], ('event', event['seq']), event)
+
+
+class SnapshotRelay:
+    """
+    Forwards what ingest shares to this process's broker.
+
+    Positions come from the latest-position store (the snapshot written by
+    the ingest process, or memory when ingest runs here), events from the
+    journal written by ``share_event``. The relay thread only runs while the
+    broker has subscribers.
+    """
+
+    def __init__(self, broker, store, interval=None):
+        self.broker = broker
+        self.store = store
+        if interval is None:
+            interval = getattr(settings, 'LOCATION_SNAPSHOT_INTERVAL', 1.0)
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def ensure_running(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='live-feed-relay', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        seq = self.store.version()
+        event_seq = max((event['seq'] for event in cache.get(EVENTS_KEY, [])), default=0)
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self.broker.has_subscribers():
+                    self._thread = None
+                    return
+            try:
+                seq, changed = self.store.changes_since(seq)
+                if changed:
+                    self.broker.publish_positions(changed)
+                for event in cache.get(EVENTS_KEY, []):
+                    if event['seq'] > event_seq:
+                        self.broker.publish_event(event)
+                        event_seq = event['seq']
+            except Exception as e:
+                logger.exception(f"Error relaying live updates: {e}")
+
+
+# Per process: the web views subscribe, the relay publishes
+live_broker = LiveBroker()
+snapshot_relay = SnapshotRelay(live_broker, latest_positions)
@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Define a directory to store location snapshots
+LOCATION_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'location_data')
+
+# Create the directory if it doesn't exist
+if not os.path.exists(LOCATION_DIR):
+    os.makedirs(LOCATION_DIR)
+
+
+class LatestPositionStore:
+    """
+    Latest known position of every device, keyed by device_id.
+
+    The ingest process owns the table: it loads the existing snapshot before
+    its first write, then ``update``/``update_many`` are O(1) per device and
+    only touch memory, and the whole table is written to a single
+    JSON snapshot at most once per ``snapshot_interval`` seconds (atomically,
+    through a temporary file). Other processes, such as the web workers, read
+    through the same API and reload the snapshot only when its modification
+    time changes.
+
+    Every update bumps ``version``, a sequence number saved with the snapshot,
+    and stamps the updated positions with it as ``seq``, so readers can tell
+    whether anything moved and fetch only what moved since a previous read.
+    """
+
+    def __init__(self, snapshot_path=None, snapshot_interval=None):
+        self.snapshot_path = snapshot_path or os.path.join(LOCATION_DIR, 'latest_positions.json')
+        if snapshot_interval is None:
+            snapshot_interval = getattr(settings, 'LOCATION_SNAPSHOT_INTERVAL', 1.0)
+        self.snapshot_interval = snapshot_interval
+
+        self._positions = {}
+        # Seeded with the clock (in microseconds, to stay exact as a JavaScript number)
+        # so sequence numbers keep increasing across restarts of the ingest process
+        self._version = time.time_ns() // 1000
+        self._lock = threading.Lock()
+        self._owner = False  # True once this process has written positions
+        self._dirty = False
+        self._last_snapshot = 0.0
+        self._loaded_mtime = None
+
+    # ---- writes (ingest process) ------------------------------------------
+
+    def update(self, device_id, latitude, longitude, speed, updated_at=None):
+        self.update_many([device_id], [latitude], [longitude], [speed], updated_at)
+
+    def update_many(self, device_ids, latitudes, longitudes, speeds, updated_at=None):
+        """Store the latest position of several devices (parallel sequences)."""
+        updated_at = updated_at or time.time()
+        if not self._owner:
+            # Carry on from the previous ingest process's snapshot and version
+            self._reload_if_changed()
+        with self._lock:
+            self._owner = True
+            self._version += 1
+            for device_id, lat, lon, speed in zip(device_ids, latitudes, longitudes, speeds):
+                self._positions[device_id] = {
+                    'latitude': float(lat),
+                    'longitude': float(lon),
+                    'speed': float(speed),
+                    'device_id': device_id,
+                    'updated_at': updated_at,
+                    'seq': self._version,
+                }
+            self._dirty = True
+        self.snapshot_if_due()
+
+    def snapshot_if_due(self):
+        if self._dirty and time.monotonic() - self._last_snapshot >= self.snapshot_interval:
+            self.snapshot()
+
+    def snapshot(self):
+        """Write the whole table to the snapshot file."""
+        with self._lock:
+            positions = dict(self._positions)
+            version = self._version
+            self._dirty = False
+            self._last_snapshot = time.monotonic()
+
+        tmp_path = f'{self.snapshot_path}.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'saved_at': time.time(), 'version': version, 'positions': positions}, f)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError as e:
+            logger.error(f"Could not write location snapshot {self.snapshot_path}: {e}")
+
+    # ---- reads ------------------------------------------------------------
+
+    def _reload_if_changed(self):
+        if self._owner:
+            return
+        try:
+            mtime = os.stat(self.snapshot_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            positions = snapshot.get('positions', {})
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read location snapshot {self.snapshot_path}: {e}")
+            return
+        with self._lock:
+            self._positions = positions
+            # Older snapshots have no version; their mtime changes whenever they do
+            self._version = snapshot.get('version', mtime // 1000)
+            self._loaded_mtime = mtime
+
+    def get(self, device_id):
+        """Latest position dict of one device, or None."""
+        self._reload_if_changed()
+        return self._positions.get(device_id)
+
+    def get_many(self, device_ids):
+        """
+        Latest positions of several devices in one lookup.
+
+        Returns:
+            dict: device_id -> position dict, only for devices with a known position
+        """
+        self._reload_if_changed()
+        positions = self._positions
+        return {device_id: positions[device_id] for device_id in device_ids if device_id in positions}
+
+    def version(self):
+        """Number that changes whenever any position changes."""
+        self._reload_if_changed()
+        return self._version
+
+    def changes_since(self, seq, device_ids=None):
+        """
+        Positions updated after a sequence number.
+
+        Args:
+            seq (int): Sequence number (``version``) of the previous read, 0 for all
+            device_ids (iterable): Restrict to these devices, None for all
+
+        Returns:
+            tuple: (current version, dict device_id -> position dict)
+        """
+        self._reload_if_changed()
+        with self._lock:
+            positions = self._positions
+            if device_ids is None:
+                device_ids = list(positions)
+            changed = {
+                device_id: positions[device_id]
+                for device_id in device_ids
+                if device_id in positions and positions[device_id].get('seq', 0) > seq
+            }
+            return self._version, changed
+
+    def all(self):
+        self._reload_if_changed()
+        return dict(self._positions)
+
+
+# Shared by the ingest pipeline (writer) and the views (readers)
+latest_positions = LatestPositionStore()
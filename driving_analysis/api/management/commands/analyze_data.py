@@ -1,9 +1,20 @@
 import pandas as pd
 import numpy as np
+from django.core.cache import cache
 from django.core.management.base import BaseCommand
-from api.views import cleansed_buffer
-from api.models import DrivingData
-from Analysis_cleansing.analysis_intialy_done import analyze_chunk, score_chunk
+from api.bulk_writer import DrivingDataWriter
+from api.models import Car
+from api.rolling import rolling_range
+
+# Cleansed buffer column -> column name expected by analyze_chunk
+CHUNK_COLUMNS = {
+    'counter': 'Counter',
+    'speed': 'Speed(km/h)',
+    'ax': 'Ax',
+    'ay': 'Ay',
+    'az': 'Az',
+    'yaw': 'Yaw',
+}
 
 def analyze_chunk(chunk_df):
     chunk_df = chunk_df.copy()
@@ -66,7 +77,7 @@ def analyze_chunk(chunk_df):
 
         # Swerving detection logic
         window_swerve = 12  # Window size for checking angle change
-        chunk_df['yaw_change'] = chunk_df['Yaw'].rolling(window=window_swerve, min_periods=1, center=True).apply(lambda x: max(x) - min(x), raw=True).abs()
+        chunk_df['yaw_change'] = rolling_range(chunk_df['Yaw'], window_swerve, center=True, min_periods=1)
         swerve_mask = (
             (chunk_df['yaw_change'] >= 4) & (chunk_df['yaw_change'] <= 12) & 
             (chunk_df['Ay'].abs() > 2000)  # Aggressiveness condition based on Az
@@ -80,7 +91,7 @@ def analyze_chunk(chunk_df):
         
         # Additional logic to reset label to 'Normal' if change in degree > 40 in a window of 50 readings
         window_reset = 90
-        chunk_df['large_yaw_change'] = chunk_df['Yaw'].rolling(window=window_reset, min_periods=1, center=True).apply(lambda x: max(x) - min(x), raw=True).abs()
+        chunk_df['large_yaw_change'] = rolling_range(chunk_df['Yaw'], window_reset, center=True, min_periods=1)
         reset_mask = chunk_df['large_yaw_change'] > 40
         chunk_df.loc[reset_mask, 'labels'] = 'Normal'
 
@@ -138,12 +149,38 @@ def score_chunk(chunk_df, results):
 
     return score
 
+def save_labeled_chunk(writer, labeled_chunk, analysis_results, score, car_ids):
+    """Queue one DrivingData row per labeled reading; readings of unknown devices are skipped"""
+    for labeled_row in labeled_chunk.to_dict('records'):
+        car_id = car_ids.get(labeled_row.get('device_name'))
+        if car_id is None:
+            continue
+        writer.add(
+            car_id_id=car_id,
+            speed=labeled_row['Speed(km/h)'],
+            accident_detection=bool(labeled_row.get('accident', 0)),
+            distance=labeled_row['distance'],
+            harsh_braking_events=analysis_results['harsh_braking_events'],
+            harsh_acceleration_events=analysis_results['harsh_acceleration_events'],
+            swerving_events=analysis_results['swerving_events'],
+            potential_swerving_events=analysis_results['potential_swerving_events'],
+            over_speed_events=analysis_results['over_speed_events'],
+            score=score
+        )
+
 class Command(BaseCommand):
     help = 'Analyzes the cleansed data in the buffer'
 
     def handle(self, *args, **kwargs):
+        cleansed_buffer = cache.get('cleansed_buffer', [])
         if cleansed_buffer:
-            data = pd.DataFrame(cleansed_buffer)
+            # The cleansed buffer uses the ingest column names, analyze_chunk the CSV ones
+            data = pd.DataFrame(cleansed_buffer).rename(columns=CHUNK_COLUMNS)
+            writer = DrivingDataWriter(batch_size=1000)
+
+            # Resolve every device in the buffer to its car with a single query
+            device_names = data['device_name'].dropna().unique().tolist() if 'device_name' in data else []
+            car_ids = dict(Car.objects.filter(device_id__in=device_names).values_list('device_id', 'id'))
             accumulated_distance = 0.0
             current_chunk = []
             segment_data = []
@@ -162,17 +199,8 @@ class Command(BaseCommand):
                     scores.append(score)
                     current_chunk = []
 
-                    # Save labeled data to the database
-                    for idx, labeled_row in labeled_chunk.iterrows():
-                        DrivingData.objects.create(
-                            distance=labeled_row['distance'],
-                            harsh_braking_events=analysis_results['harsh_braking_events'],
-                            harsh_acceleration_events=analysis_results['harsh_acceleration_events'],
-                            swerving_events=analysis_results['swerving_events'],
-                            potential_swerving_events=analysis_results['potential_swerving_events'],
-                            over_speed_events=analysis_results['over_speed_events'],
-                            score=score
-                        )
+                    # Queue labeled data for batched database writes
+                    save_labeled_chunk(writer, labeled_chunk, analysis_results, score, car_ids)
 
             # Process remaining data
             if current_chunk:
@@ -181,17 +209,12 @@ class Command(BaseCommand):
                     labeled_chunk, analysis_results = analyze_chunk(chunk_df)
                     segment_data.append(analysis_results)
 
-                    # Save labeled data to the database
-                    for idx, labeled_row in labeled_chunk.iterrows():
-                        DrivingData.objects.create(
-                            distance=labeled_row['distance'],
-                            harsh_braking_events=analysis_results['harsh_braking_events'],
-                            harsh_acceleration_events=analysis_results['harsh_acceleration_events'],
-                            swerving_events=analysis_results['swerving_events'],
-                            potential_swerving_events=analysis_results['potential_swerving_events'],
-                            over_speed_events=analysis_results['over_speed_events'],
-                            score=score
-                        )
+                    # Queue labeled data for batched database writes
+                    save_labeled_chunk(writer, labeled_chunk, analysis_results, score, car_ids)
+
+            writer.close()
+            print(f"Saved {writer.rows_written} rows in {writer.flushes} bulk inserts "
+                  f"(avg {writer.metrics()['avg_flush_ms']} ms per insert)")
 
             total_score = sum(scores)
             final_score = total_score / len(segment_data) if segment_data else 0
@@ -0,0 +1,77 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from api.models import Car, DrivingData, Driver, Trip
+
+CAR_CREATED_INDEX = 'drivingdata_car_created_idx'
+CREATED_INDEX = 'drivingdata_created_idx'
+TRIP_INDEX = 'trip_car_end_idx'
+
+
+def analytics_queries(car_id, company_id):
+    """(name, queryset, indexes any of which the plan must use) of the hot analytics queries."""
+    start_date = timezone.now() - timedelta(days=7)
+    company_cars = Car.objects.filter(company_id=company_id).values_list('id', flat=True)
+    latest_score = DrivingData.objects.filter(
+        car_id=OuterRef('car_id'),
+        created_at__gte=start_date
+    ).order_by('-created_at', '-id').values('score')[:1]
+    return [
+        ('get_fleet_overview totals',
+         DrivingData.objects.filter(car_id__in=company_cars, created_at__gte=start_date),
+         (CAR_CREATED_INDEX, CREATED_INDEX)),
+        ('get_fleet_overview latest score per driver',
+         Driver.objects.filter(company_id=company_id).annotate(score=Subquery(latest_score)),
+         (CAR_CREATED_INDEX,)),
+        ('get_car_driving_data latest records',
+         DrivingData.objects.filter(car_id=car_id).order_by('-created_at')[:10],
+         (CAR_CREATED_INDEX,)),
+        ('get_car_trips',
+         Trip.objects.filter(car_id__in=[car_id], end_time__gte=start_date).order_by('-start_time', '-id'),
+         (TRIP_INDEX,)),
+        ('rebuild_trips',
+         DrivingData.objects.filter(car_id=car_id, created_at__gte=start_date).order_by('car_id', 'created_at'),
+         (CAR_CREATED_INDEX,)),
+        ('recalculate_car_scores',
+         DrivingData.objects.filter(car_id__in=[car_id], created_at__gte=start_date),
+         (CAR_CREATED_INDEX,)),
+        ('prune_driving_data',
+         DrivingData.objects.filter(created_at__lt=start_date).order_by().values('id'),
+         (CREATED_INDEX,)),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs EXPLAIN on the analytics queries over DrivingData and trips and fails if one '
+        'of them does not use the time indexes. Run it against a database with realistic '
+        'data: on a nearly empty table the planner may prefer a full scan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--car', type=int, help='Car id used in the queries (default: any car)')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan')
+
+    def handle(self, *args, **options):
+        car = Car.objects.filter(id=options['car']).first() if options['car'] else Car.objects.first()
+        car_id = car.id if car else 0
+        company_id = car.company_id_id if car else 0
+
+        failures = []
+        for name, queryset, indexes in analytics_queries(car_id, company_id):
+            plan = queryset.explain()
+            used = [index for index in indexes if index in plan]
+            if used:
+                self.stdout.write(f'OK    {name}: {used[0]}')
+            else:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'FAIL  {name}: none of {", ".join(indexes)} used'))
+            if options['verbose_plans'] or not used:
+                self.stdout.write('      ' + plan.replace('\n', '\n      '))
+
+        if failures:
+            raise CommandError(f'{len(failures)} queries do not use the time indexes')
+        self.stdout.write(self.style.SUCCESS('All analytics queries use the time indexes'))
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Min
+from django.utils import timezone
+
+from api import partitioning
+from api.models import DrivingData
+
+
+class Command(BaseCommand):
+    help = (
+        'Partitions the DrivingData table by month on MySQL, or adds the partitions of the '
+        'coming months to an already partitioned table. Drops the car_id foreign key '
+        'constraint and makes the primary key (id, created_at); see api/partitioning.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help='Future months to create partitions for (default: 3)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Print the SQL without running it')
+
+    def handle(self, *args, **options):
+        if not partitioning.is_mysql():
+            raise CommandError(f'Partitioning is only supported on MySQL, not {connection.vendor}')
+
+        last_month = partitioning.add_months(timezone.now().date(), options['months_ahead'])
+        with connection.cursor() as cursor:
+            partitions = partitioning.existing_partitions(cursor)
+            if partitions:
+                statement = partitioning.extend_statement(partitions, last_month)
+                statements = [statement] if statement else []
+            else:
+                referencing = partitioning.referencing_tables(cursor)
+                if referencing:
+                    raise CommandError(
+                        f"Tables with a foreign key to DrivingData can't coexist with partitioning: {', '.join(referencing)}")
+                first = DrivingData.objects.aggregate(first=Min('created_at'))['first'] or timezone.now()
+                statements = partitioning.partition_statements(
+                    first.date(), last_month, partitioning.foreign_keys(cursor))
+
+            if not statements:
+                self.stdout.write(f'Partitions already exist up to {last_month:%Y-%m}')
+                return
+            for statement in statements:
+                self.stdout.write(statement + ';')
+                if not options['dry_run']:
+                    cursor.execute(statement)
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'DrivingData is partitioned up to {last_month:%Y-%m}'))
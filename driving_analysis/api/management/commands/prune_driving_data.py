@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from api import partitioning
+from api.models import DrivingData
+from api.overview_cache import bump_data_generation
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes DrivingData older than the retention period. Whole months are dropped '
+        'as partitions when the table is partitioned; the rest is deleted in batches. '
+        'Daily rollups are kept.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Days of driving data to keep (default: DRIVING_DATA_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows per DELETE when rows are deleted in batches (default: 5000)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be deleted without deleting it')
+
+    def handle(self, *args, **options):
+        days = options['days'] or getattr(settings, 'DRIVING_DATA_RETENTION_DAYS', 365)
+        # Whole days only, so the rollups of the remaining days stay rebuildable
+        cutoff = partitioning.day_start(timezone.now().date() - timedelta(days=days))
+        expired = DrivingData.objects.filter(created_at__lt=cutoff)
+
+        dropped = []
+        if partitioning.is_mysql():
+            with connection.cursor() as cursor:
+                dropped = partitioning.expired_partitions(partitioning.existing_partitions(cursor), cutoff)
+                if dropped:
+                    statement = partitioning.drop_statement(dropped)
+                    self.stdout.write(statement + ';')
+                    if not options['dry_run']:
+                        cursor.execute(statement)
+
+        if options['dry_run']:
+            self.stdout.write(f'{expired.count()} rows older than {cutoff:%Y-%m-%d} would be deleted')
+            return
+
+        deleted = 0
+        while True:
+            ids = list(expired.order_by().values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted += DrivingData.objects.filter(id__in=ids).delete()[0]
+
+        if dropped or deleted:
+            bump_data_generation()
+        self.stdout.write(self.style.SUCCESS(
+            f'Dropped {len(dropped)} partitions and deleted {deleted} rows older than {cutoff:%Y-%m-%d}'))
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Backfills or repairs the per-car daily DrivingData rollups from the raw rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--car', type=int, action='append', dest='cars',
+                            help='Car id to rebuild (repeatable, default: every car)')
+        parser.add_argument('--days', type=int,
+                            help='Only rebuild the last N days (default: all history)')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days']) if options['days'] else None
+        written = rebuild_rollups(car_ids=options['cars'], since=since)
+        scope = f"the last {options['days']} days" if since else 'all history'
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} daily rollups over {scope}'))
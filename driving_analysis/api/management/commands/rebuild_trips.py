@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.trips import rebuild_trips
+
+
+def _parse_date(value):
+    try:
+        return timezone.make_aware(datetime.strptime(value, '%Y-%m-%d'))
+    except ValueError:
+        raise CommandError(f'Invalid date {value!r}, expected YYYY-MM-DD')
+
+
+class Command(BaseCommand):
+    help = 'Regenerates stored trips from DrivingData for some or all cars and a date range'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--car', type=int, action='append', dest='cars',
+                            help='Car id to rebuild (repeatable, default: every car)')
+        parser.add_argument('--from', dest='since', help='First day to rebuild, YYYY-MM-DD (default: oldest data)')
+        parser.add_argument('--to', dest='until', help='Day after the last one to rebuild, YYYY-MM-DD (default: now)')
+
+    def handle(self, *args, **options):
+        since = _parse_date(options['since']) if options['since'] else None
+        until = _parse_date(options['until']) if options['until'] else None
+        created = rebuild_trips(car_ids=options['cars'], since=since, until=until)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} trips'))
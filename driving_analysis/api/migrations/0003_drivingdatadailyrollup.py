@@ -0,0 +1,35 @@
+# Generated by Django 5.1.5 on 2026-10-17 17:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0002_drivingdata_car_id"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DrivingDataDailyRollup",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("day", models.DateField()),
+                ("records", models.IntegerField(default=0)),
+                ("distance", models.FloatField(default=0.0)),
+                ("score_sum", models.FloatField(default=0.0)),
+                ("min_score", models.FloatField(blank=True, null=True)),
+                ("max_score", models.FloatField(blank=True, null=True)),
+                ("harsh_braking_events", models.IntegerField(default=0)),
+                ("harsh_acceleration_events", models.IntegerField(default=0)),
+                ("swerving_events", models.IntegerField(default=0)),
+                ("potential_swerving_events", models.IntegerField(default=0)),
+                ("over_speed_events", models.IntegerField(default=0)),
+                ("car_id", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="api.car")),
+            ],
+            options={
+                "constraints": [models.UniqueConstraint(fields=("car_id", "day"), name="unique_rollup_car_day")],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.5 on 2026-10-17 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_drivingdatadailyrollup"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="drivingdata",
+            index=models.Index(fields=["car_id", "created_at"], name="drivingdata_car_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="drivingdata",
+            index=models.Index(fields=["created_at"], name="drivingdata_created_idx"),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.5 on 2026-10-17 17:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_drivingdata_time_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Trip",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("start_time", models.DateTimeField()),
+                ("end_time", models.DateTimeField()),
+                ("segments", models.IntegerField(default=0)),
+                ("distance", models.FloatField(default=0.0)),
+                ("score_sum", models.FloatField(default=0.0)),
+                ("harsh_braking_events", models.IntegerField(default=0)),
+                ("harsh_acceleration_events", models.IntegerField(default=0)),
+                ("swerving_events", models.IntegerField(default=0)),
+                ("over_speed_events", models.IntegerField(default=0)),
+                ("car_id", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="api.car")),
+            ],
+            options={
+                "indexes": [models.Index(fields=["car_id", "end_time"], name="trip_car_end_idx")],
+            },
+        ),
+    ]
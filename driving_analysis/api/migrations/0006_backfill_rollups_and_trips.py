@@ -0,0 +1,107 @@
+# Generated by Django 5.1.5 on 2026-10-17 18:05
+
+from datetime import timedelta
+
+from django.db import migrations
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate
+
+# Same columns as api/rollups.py and api/trips.py, frozen for this migration
+EVENT_FIELDS = (
+    "harsh_braking_events",
+    "harsh_acceleration_events",
+    "swerving_events",
+    "potential_swerving_events",
+    "over_speed_events",
+)
+TRIP_FIELDS = (
+    "car_id",
+    "created_at",
+    "distance",
+    "score",
+    "harsh_braking_events",
+    "harsh_acceleration_events",
+    "swerving_events",
+    "over_speed_events",
+)
+# Gap between two segments of a car that starts a new trip, as in api/trips.py
+TRIP_GAP = timedelta(minutes=10)
+TRIP_TOTALS = (
+    "segments",
+    "distance",
+    "score_sum",
+    "harsh_braking_events",
+    "harsh_acceleration_events",
+    "swerving_events",
+    "over_speed_events",
+)
+
+
+def backfill_rollups(apps, schema_editor):
+    DrivingData = apps.get_model("api", "DrivingData")
+    DrivingDataDailyRollup = apps.get_model("api", "DrivingDataDailyRollup")
+
+    totals = DrivingData.objects.annotate(day=TruncDate("created_at")).values("car_id", "day").annotate(
+        records=Count("id"),
+        distance_total=Sum("distance"),
+        score_total=Sum("score"),
+        min_score=Min("score"),
+        max_score=Max("score"),
+        **{f"{field}_total": Sum(field) for field in EVENT_FIELDS},
+    ).order_by()
+    DrivingDataDailyRollup.objects.all().delete()
+    DrivingDataDailyRollup.objects.bulk_create(
+        (
+            DrivingDataDailyRollup(
+                car_id_id=row["car_id"],
+                day=row["day"],
+                records=row["records"],
+                distance=row["distance_total"] or 0.0,
+                score_sum=row["score_total"] or 0.0,
+                min_score=row["min_score"],
+                max_score=row["max_score"],
+                **{field: row[f"{field}_total"] or 0 for field in EVENT_FIELDS},
+            )
+            for row in totals
+        ),
+        batch_size=1000,
+    )
+
+
+def segment_trips(rows):
+    """Trip field values of segments sorted by car then created_at; frozen copy of api/trips.py."""
+    trip = None
+    for car_id, created_at, distance, score, *events in rows:
+        if trip is None or car_id != trip["car_id_id"] or created_at - trip["end_time"] > TRIP_GAP:
+            if trip is not None:
+                yield trip
+            trip = {"car_id_id": car_id, "start_time": created_at, **{field: 0 for field in TRIP_TOTALS}}
+        trip["end_time"] = created_at
+        trip["segments"] += 1
+        trip["distance"] += distance
+        trip["score_sum"] += score
+        for field, count in zip(TRIP_TOTALS[3:], events):
+            trip[field] += count
+    if trip is not None:
+        yield trip
+
+
+def backfill_trips(apps, schema_editor):
+    DrivingData = apps.get_model("api", "DrivingData")
+    Trip = apps.get_model("api", "Trip")
+
+    rows = DrivingData.objects.order_by("car_id", "created_at").values_list(*TRIP_FIELDS).iterator(chunk_size=2000)
+    Trip.objects.all().delete()
+    Trip.objects.bulk_create((Trip(**trip) for trip in segment_trips(rows)), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_trip"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+        migrations.RunPython(backfill_trips, migrations.RunPython.noop),
+    ]
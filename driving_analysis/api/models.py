@@ -56,6 +56,57 @@ class DrivingData(models.Model):
     score = models.FloatField(default=100.0)
     # Add a simple JsonField to track who read this notification
     read_by = models.BooleanField(default=False, blank=True)
+
+    class Meta:
+        indexes = [
+            # Per-car time range scans, ordered by created_at
+            models.Index(fields=['car_id', 'created_at'], name='drivingdata_car_created_idx'),
+            # Fleet-wide time range scans and retention
+            models.Index(fields=['created_at'], name='drivingdata_created_idx'),
+        ]
+
+class Trip(models.Model):
+    """Consecutive DrivingData segments of a car without a gap over 10 minutes (see api/trips.py)."""
+    car_id = models.ForeignKey('Car', on_delete=models.CASCADE)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    segments = models.IntegerField(default=0)
+    distance = models.FloatField(default=0.0)
+    score_sum = models.FloatField(default=0.0)
+    harsh_braking_events = models.IntegerField(default=0)
+    harsh_acceleration_events = models.IntegerField(default=0)
+    swerving_events = models.IntegerField(default=0)
+    over_speed_events = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['car_id', 'end_time'], name='trip_car_end_idx'),
+        ]
+
+    @property
+    def score(self):
+        return self.score_sum / self.segments if self.segments else 0
+
+class DrivingDataDailyRollup(models.Model):
+    """Per-car daily totals of DrivingData, maintained at ingest (see api/rollups.py)."""
+    car_id = models.ForeignKey('Car', on_delete=models.CASCADE)
+    day = models.DateField()
+    records = models.IntegerField(default=0)
+    distance = models.FloatField(default=0.0)
+    score_sum = models.FloatField(default=0.0)
+    min_score = models.FloatField(null=True, blank=True)
+    max_score = models.FloatField(null=True, blank=True)
+    harsh_braking_events = models.IntegerField(default=0)
+    harsh_acceleration_events = models.IntegerField(default=0)
+    swerving_events = models.IntegerField(default=0)
+    potential_swerving_events = models.IntegerField(default=0)
+    over_speed_events = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['car_id', 'day'], name='unique_rollup_car_day'),
+        ]
+
 class Employee(models.Model):
     Name = models.CharField(max_length=255)
     gender = models.CharField(max_length=6, choices=[('male', 'Male'), ('female', 'Female')])
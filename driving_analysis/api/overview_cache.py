@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Shared cache key changed whenever DrivingData rows are written or rescored,
+# so every cached dashboard result computed before goes stale at once
+DATA_GENERATION_KEY = 'driving_data_generation'
+
+
+def data_generation():
+    return cache.get(DATA_GENERATION_KEY, 0)
+
+
+def bump_data_generation():
+    """Mark every cached dashboard result as stale (call after writing DrivingData)."""
+    cache.set(DATA_GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def overview_key(name, *params):
+    """
+    Cache key of a dashboard result for the current data generation.
+
+    Results of older generations are never read again and simply expire.
+    """
+    return ':'.join(str(param) for param in (name, data_generation(), *params))
+
+
+def get_overview(key):
+    return cache.get(key)
+
+
+def set_overview(key, result, ttl=None):
+    cache.set(key, result, ttl if ttl is not None else getattr(settings, 'FLEET_OVERVIEW_TTL', 30))
@@ -0,0 +1,147 @@
+from datetime import date, datetime, time, timezone as dt_timezone
+
+from django.db import connection
+
+# Optional monthly range partitioning of the DrivingData table on MySQL.
+#
+# A partitioned table lets the retention job drop a whole month with one
+# ``ALTER TABLE ... DROP PARTITION`` instead of deleting rows one batch at a
+# time, and lets range queries on created_at skip the partitions outside the
+# range. MySQL puts two restrictions on partitioned InnoDB tables:
+#
+# * Every unique key, the primary key included, has to contain the
+#   partitioning column, so the primary key becomes (id, created_at). id stays
+#   AUTO_INCREMENT and unique in practice, and Django keeps using it as pk.
+# * Partitioned tables can neither have foreign keys nor be referenced by one.
+#   The car_id foreign key constraint is dropped (its index is kept). Django
+#   still applies on_delete=CASCADE itself when a Car is deleted through the
+#   ORM, but raw SQL deletes of cars are no longer checked by the database, and
+#   no other table may declare a database-level foreign key to DrivingData.
+#
+# Migrations that rebuild the table (e.g. altering the primary key) have to be
+# reviewed against the partitioned layout before they are applied.
+
+# Catch-all partition for rows past the last monthly boundary
+MAX_PARTITION = 'pmax'
+
+
+def table_name():
+    from .models import DrivingData
+    return DrivingData._meta.db_table
+
+
+def is_mysql():
+    return connection.vendor == 'mysql'
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    """Name of the partition holding the rows of ``month`` (e.g. p202610)."""
+    return f'p{month:%Y%m}'
+
+
+def _month_partition(month):
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN ('{add_months(month, 1):%Y-%m-%d} 00:00:00')"
+
+
+def _months(first, last):
+    month = month_start(first)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def existing_partitions(cursor):
+    """(name, upper bound or None for MAXVALUE) of the current partitions, in order."""
+    cursor.execute(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+        "ORDER BY PARTITION_ORDINAL_POSITION",
+        [table_name()],
+    )
+    partitions = []
+    for name, description in cursor.fetchall():
+        bound = None
+        if description and description != 'MAXVALUE':
+            bound = datetime.strptime(description.strip("'")[:10], '%Y-%m-%d').replace(tzinfo=dt_timezone.utc)
+        partitions.append((name, bound))
+    return partitions
+
+
+def foreign_keys(cursor):
+    """Names of the foreign key constraints declared on the DrivingData table."""
+    cursor.execute(
+        "SELECT CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND CONSTRAINT_TYPE = 'FOREIGN KEY'",
+        [table_name()],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def referencing_tables(cursor):
+    """Tables with a foreign key to DrivingData, which would prevent partitioning."""
+    cursor.execute(
+        "SELECT DISTINCT TABLE_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+        "WHERE CONSTRAINT_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME = %s",
+        [table_name()],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def partition_statements(first_month, last_month, constraints):
+    """
+    SQL turning the plain table into a monthly partitioned one.
+
+    Args:
+        first_month, last_month (date): Months to create partitions for
+        constraints (list): Foreign key constraints to drop first
+    """
+    table = table_name()
+    statements = [f'ALTER TABLE `{table}` DROP FOREIGN KEY `{name}`' for name in constraints]
+    statements.append(f'ALTER TABLE `{table}` DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `created_at`)')
+    partitions = [_month_partition(month) for month in _months(first_month, last_month)]
+    partitions.append(f'PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)')
+    statements.append(
+        f'ALTER TABLE `{table}` PARTITION BY RANGE COLUMNS(`created_at`) (\n    '
+        + ',\n    '.join(partitions) + '\n)'
+    )
+    return statements
+
+
+def extend_statement(partitions, last_month):
+    """SQL splitting new monthly partitions off the catch-all one, or None if there is nothing to add."""
+    bounds = [bound for _, bound in partitions if bound is not None]
+    if not bounds:
+        return None
+    # The last bound is the first day of the first month without a partition
+    months = list(_months(max(bounds).date(), last_month))
+    if not months:
+        return None
+    parts = [_month_partition(month) for month in months]
+    parts.append(f'PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)')
+    return (
+        f'ALTER TABLE `{table_name()}` REORGANIZE PARTITION {MAX_PARTITION} INTO (\n    '
+        + ',\n    '.join(parts) + '\n)'
+    )
+
+
+def expired_partitions(partitions, cutoff):
+    """Monthly partitions whose rows are all older than ``cutoff``."""
+    return [name for name, bound in partitions if bound is not None and bound <= cutoff]
+
+
+def drop_statement(names):
+    return f"ALTER TABLE `{table_name()}` DROP PARTITION {', '.join(names)}"
+
+
+def day_start(day):
+    """Midnight UTC of a date, as an aware datetime."""
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
@@ -0,0 +1,158 @@
+import threading
+
+import numpy as np
+
+# Default number of telemetry lines collected per device before a window is
+# handed to cleansing and analysis
+BUFFER_CAPACITY = 1000
+
+# Float columns stored for every telemetry line
+FLOAT_COLUMNS = ('latitude', 'longitude', 'speed', 'ax', 'ay', 'az', 'yaw')
+
+
+class DeviceRingBuffer:
+    """
+    Fixed-capacity, array-backed telemetry window for a single device.
+
+    Every column lives in a preallocated NumPy array, so appending a line is a
+    handful of scalar writes regardless of the window size. Once the buffer is
+    full the oldest line is overwritten.
+    """
+
+    def __init__(self, device_name, capacity=BUFFER_CAPACITY):
+        if capacity <= 0:
+            raise ValueError('capacity must be positive')
+        self.device_name = device_name
+        self.capacity = capacity
+        self._counter = np.zeros(capacity, dtype=np.int64)
+        # Timestamps are kept as the raw strings sent by the ESP32 and parsed by cleanse_data
+        self._timestamp = np.empty(capacity, dtype=object)
+        self._floats = {name: np.zeros(capacity, dtype=np.float64) for name in FLOAT_COLUMNS}
+        self._accident = np.zeros(capacity, dtype=np.int8)
+        self._head = 0  # Next write position
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def is_full(self):
+        return self._size == self.capacity
+
+    def append(self, record):
+        """
+        Append one parsed telemetry line.
+
+        Args:
+            record (dict): Parsed line with the keys produced by the MQTT client
+
+        Returns:
+            bool: True when the buffer has reached capacity and should be drained
+        """
+        i = self._head
+        self._counter[i] = record.get('counter', 0)
+        self._timestamp[i] = record.get('timestamp')
+        for name, column in self._floats.items():
+            column[i] = record.get(name, 0.0)
+        self._accident[i] = record.get('accident', 0)
+
+        self._head = (i + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+        return self.is_full()
+
+    def extend(self, columns, start=0):
+        """
+        Copy lines from column arrays (e.g. a parsed TelemetryBatch) into the buffer.
+
+        At most the free space of the buffer is written, so the caller can
+        drain a full window before passing the remainder again.
+
+        Args:
+            columns (dict): Column name -> array, all of the same length
+            start (int): Index of the first line to copy
+
+        Returns:
+            int: Number of lines copied
+        """
+        total = len(columns['timestamp'])
+        free = self.capacity - self._size
+        count = min(total - start, free if free else self.capacity)
+        if count <= 0:
+            return 0
+
+        positions = (self._head + np.arange(count)) % self.capacity
+        rows = slice(start, start + count)
+        self._counter[positions] = columns['counter'][rows]
+        self._timestamp[positions] = columns['timestamp'][rows]
+        for name, column in self._floats.items():
+            column[positions] = columns[name][rows]
+        self._accident[positions] = columns['accident'][rows]
+
+        self._head = (self._head + count) % self.capacity
+        self._size = min(self._size + count, self.capacity)
+        return count
+
+    def _order(self):
+        """Index array returning the stored lines in arrival order."""
+        start = (self._head - self._size) % self.capacity
+        return (start + np.arange(self._size)) % self.capacity
+
+    def snapshot(self):
+        """
+        Copy the buffered lines out in arrival order.
+
+        Returns:
+            dict: Column name -> array, accepted directly by ``pd.DataFrame``
+        """
+        order = self._order()
+        columns = {
+            'device_name': np.full(self._size, self.device_name, dtype=object),
+            'counter': self._counter[order],
+            'timestamp': self._timestamp[order],
+        }
+        for name, column in self._floats.items():
+            columns[name] = column[order]
+        columns['accident'] = self._accident[order]
+        return columns
+
+    def drain(self):
+        """Return the buffered lines (see ``snapshot``) and empty the buffer."""
+        columns = self.snapshot()
+        self.clear()
+        return columns
+
+    def clear(self):
+        self._head = 0
+        self._size = 0
+        # Drop references to the timestamp strings
+        self._timestamp[:] = None
+
+
+class DeviceBufferRegistry:
+    """Thread-safe map of device_name -> DeviceRingBuffer, created on first use."""
+
+    def __init__(self, capacity=BUFFER_CAPACITY):
+        self.capacity = capacity
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def get(self, device_name):
+        buffer = self._buffers.get(device_name)
+        if buffer is None:
+            with self._lock:
+                buffer = self._buffers.get(device_name)
+                if buffer is None:
+                    buffer = DeviceRingBuffer(device_name, self.capacity)
+                    self._buffers[device_name] = buffer
+        return buffer
+
+    def device_names(self):
+        return list(self._buffers)
+
+    def sizes(self):
+        """Number of buffered lines per device, useful for monitoring."""
+        return {name: len(buffer) for name, buffer in self._buffers.items()}
+
+
+# Buffers used by the MQTT ingest process
+device_buffers = DeviceBufferRegistry()
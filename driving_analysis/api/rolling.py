@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+
+def _window_bounds(window, center):
+    """Samples before and after position i covered by a pandas-style window."""
+    ahead = (window - 1) // 2 if center else 0
+    return window - 1 - ahead, ahead
+
+
+def _sliding_extreme(values, window, center, ufunc, fill):
+    """
+    Max or min over every window in O(n) with the van Herk/Gil-Werman algorithm.
+
+    The padded series is cut into blocks of ``window`` samples; any window
+    spans at most two blocks, so its extreme is the suffix extreme of the
+    block it starts in combined with the prefix extreme of the block it ends in.
+    """
+    n = len(values)
+    behind, _ = _window_bounds(window, center)
+
+    # Pad so that window i spans padded[i:i + window]; the fill never wins
+    blocks = -(-(n + window - 1) // window)
+    padded = np.full(blocks * window, fill, dtype=np.float64)
+    padded[behind:behind + n] = values
+
+    grid = padded.reshape(blocks, window)
+    prefix = ufunc.accumulate(grid, axis=1).ravel()
+    suffix = ufunc.accumulate(grid[:, ::-1], axis=1)[:, ::-1].ravel()
+    return ufunc(suffix[:n], prefix[window - 1:window - 1 + n])
+
+
+def _valid_counts(valid, window, center):
+    """Number of non-NaN samples in every window."""
+    behind, ahead = _window_bounds(window, center)
+    cumulative = np.concatenate(([0], np.cumsum(valid)))
+    n = len(valid)
+    positions = np.arange(n)
+    upper = np.minimum(positions + ahead + 1, n)
+    lower = np.maximum(positions - behind, 0)
+    return cumulative[upper] - cumulative[lower]
+
+
+def _rolling(values, window, center, min_periods, kind):
+    index = values.index if isinstance(values, pd.Series) else None
+    array = np.asarray(values, dtype=np.float64)
+    if window < 1:
+        raise ValueError('window must be at least 1')
+    if min_periods is None:
+        min_periods = window
+    elif min_periods > window:
+        raise ValueError(f'min_periods {min_periods} must be <= window {window}')
+
+    valid = ~np.isnan(array)
+    results = {}
+    if kind in ('max', 'range'):
+        results['max'] = _sliding_extreme(np.where(valid, array, -np.inf), window, center, np.maximum, -np.inf)
+    if kind in ('min', 'range'):
+        results['min'] = _sliding_extreme(np.where(valid, array, np.inf), window, center, np.minimum, np.inf)
+    result = results['max'] - results['min'] if kind == 'range' else results[kind]
+
+    result = np.where(_valid_counts(valid, window, center) >= max(min_periods, 1), result, np.nan)
+    return pd.Series(result, index=index) if index is not None else result
+
+
+def rolling_max(values, window, center=False, min_periods=None):
+    """
+    Rolling maximum, equivalent to ``Series.rolling(window, min_periods, center).max()``.
+
+    Args:
+        values (Series | ndarray): Input samples; NaN values are ignored
+        window (int): Window size in samples
+        center (bool): Center the window on each sample like pandas does
+        min_periods (int): Minimum non-NaN samples for a result (default: window)
+
+    Returns:
+        Series | ndarray: Same type as the input
+    """
+    return _rolling(values, window, center, min_periods, 'max')
+
+
+def rolling_min(values, window, center=False, min_periods=None):
+    """Rolling minimum, see ``rolling_max``."""
+    return _rolling(values, window, center, min_periods, 'min')
+
+
+def rolling_range(values, window, center=False, min_periods=None):
+    """
+    Rolling ``max - min`` in O(n), without calling Python per window.
+
+    Produces the same values as
+    ``Series.rolling(window, min_periods, center).apply(lambda x: max(x) - min(x), raw=True)``
+    on NaN-free data; NaN samples are skipped instead of poisoning the window.
+    """
+    return _rolling(values, window, center, min_periods, 'range')
+
+
+def rolling_var(values, window, min_periods=None):
+    """
+    Trailing rolling sample variance (ddof=1), like ``Series.rolling(window, min_periods).var()``.
+
+    Window sums of the values and their squares come from cumulative sums,
+    so the cost is O(n) whatever the window size. The data is shifted by its
+    mean first to keep the cancellation error far below the variances
+    compared by the detection rules. NaN samples are skipped; windows with
+    fewer than two samples give NaN.
+    """
+    index = values.index if isinstance(values, pd.Series) else None
+    array = np.asarray(values, dtype=np.float64)
+    if window < 1:
+        raise ValueError('window must be at least 1')
+    if min_periods is None:
+        min_periods = window
+
+    valid = ~np.isnan(array)
+    shift = array[valid].mean() if valid.any() else 0.0
+    shifted = np.where(valid, array - shift, 0.0)
+    sums = np.concatenate(([0.0], np.cumsum(shifted)))
+    squares = np.concatenate(([0.0], np.cumsum(shifted * shifted)))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+
+    upper = np.arange(1, len(array) + 1)
+    lower = np.maximum(upper - window, 0)
+    count = counts[upper] - counts[lower]
+    total = sums[upper] - sums[lower]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = (squares[upper] - squares[lower] - total * total / count) / (count - 1)
+    result = np.where(count >= max(min_periods, 2), np.maximum(result, 0.0), np.nan)
+    return pd.Series(result, index=index) if index is not None else result
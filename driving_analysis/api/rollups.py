@@ -0,0 +1,177 @@
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import Greatest, Least, TruncDate
+from django.utils import timezone
+
+# DrivingData event columns summed into the rollup
+EVENT_FIELDS = (
+    'harsh_braking_events',
+    'harsh_acceleration_events',
+    'swerving_events',
+    'potential_swerving_events',
+    'over_speed_events',
+)
+
+
+def _day(created_at):
+    # Same day boundaries as TruncDate in the current time zone
+    return timezone.localdate(created_at) if timezone.is_aware(created_at) else created_at.date()
+
+
+def _group_rows(rows):
+    """Per (car id, day) totals of a list of DrivingData instances."""
+    groups = {}
+    for row in rows:
+        key = (row.car_id_id, _day(row.created_at))
+        totals = groups.get(key)
+        if totals is None:
+            totals = groups[key] = {
+                'records': 0, 'distance': 0.0, 'score_sum': 0.0,
+                'min_score': row.score, 'max_score': row.score,
+                **{field: 0 for field in EVENT_FIELDS},
+            }
+        totals['records'] += 1
+        totals['distance'] += row.distance
+        totals['score_sum'] += row.score
+        totals['min_score'] = min(totals['min_score'], row.score)
+        totals['max_score'] = max(totals['max_score'], row.score)
+        for field in EVENT_FIELDS:
+            totals[field] += getattr(row, field)
+    return groups
+
+
+def add_to_rollups(rows):
+    """
+    Add freshly stored DrivingData rows to their daily rollups.
+
+    One UPDATE per (car, day) in the batch adds the totals in place; days
+    without a rollup yet get one. Call it in the transaction that stored the
+    rows so both stay consistent.
+
+    Args:
+        rows (list): Saved DrivingData instances (created_at set)
+    """
+    from .models import DrivingDataDailyRollup
+
+    for (car_id, day), totals in _group_rows(rows).items():
+        increments = {
+            'records': F('records') + totals['records'],
+            'distance': F('distance') + totals['distance'],
+            'score_sum': F('score_sum') + totals['score_sum'],
+            'min_score': Least(F('min_score'), totals['min_score']),
+            'max_score': Greatest(F('max_score'), totals['max_score']),
+            **{field: F(field) + totals[field] for field in EVENT_FIELDS},
+        }
+        rollup = DrivingDataDailyRollup.objects.filter(car_id_id=car_id, day=day)
+        if rollup.update(**increments):
+            continue
+        try:
+            # Savepoint, so losing a race with another writer keeps the outer transaction usable
+            with transaction.atomic():
+                DrivingDataDailyRollup.objects.create(car_id_id=car_id, day=day, **totals)
+        except IntegrityError:
+            rollup.update(**increments)
+
+
+def rebuild_rollups(car_ids=None, since=None):
+    """
+    Recompute rollups from the raw DrivingData rows.
+
+    Used to backfill the table and to repair it after DrivingData is changed
+    in place (e.g. rescoring).
+
+    Args:
+        car_ids (list): Cars to rebuild, None for every car
+        since (datetime): Rebuild the days from this one on, None for all days
+            that still have raw data
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    from .models import DrivingData, DrivingDataDailyRollup
+
+    data = DrivingData.objects.all()
+    rollups = DrivingDataDailyRollup.objects.all()
+    if car_ids is not None:
+        data = data.filter(car_id__in=car_ids)
+        rollups = rollups.filter(car_id__in=car_ids)
+    if since is None:
+        # Days older than the raw data (pruned by retention) keep their rollups
+        since = data.aggregate(first=Min('created_at'))['first']
+        if since is None:
+            return 0
+    first_day = _day(since)
+    # A plain range on created_at, so the (car_id, created_at) index is used
+    data = data.filter(created_at__gte=timezone.make_aware(datetime.combine(first_day, time.min)))
+    rollups = rollups.filter(day__gte=first_day)
+
+    totals = data.annotate(day=TruncDate('created_at')).values('car_id', 'day').annotate(
+        records=Count('id'),
+        distance_total=Sum('distance'),
+        score_sum=Sum('score'),
+        min_score=Min('score'),
+        max_score=Max('score'),
+        **{f'{field}_total': Sum(field) for field in EVENT_FIELDS},
+    ).order_by()
+
+    new_rollups = [
+        DrivingDataDailyRollup(
+            car_id_id=row['car_id'],
+            day=row['day'],
+            records=row['records'],
+            distance=row['distance_total'] or 0.0,
+            score_sum=row['score_sum'] or 0.0,
+            min_score=row['min_score'],
+            max_score=row['max_score'],
+            **{field: row[f'{field}_total'] or 0 for field in EVENT_FIELDS},
+        )
+        for row in totals
+    ]
+    with transaction.atomic():
+        rollups.delete()
+        DrivingDataDailyRollup.objects.bulk_create(new_rollups, batch_size=1000)
+    return len(new_rollups)
+
+
+def window_totals(car_ids, since):
+    """
+    Distance, average score and event totals of DrivingData created since a moment.
+
+    The days after ``since`` are read from the rollups; the rest of the day
+    ``since`` falls in is aggregated from the raw rows, so the totals match
+    a plain ``created_at >= since`` aggregate.
+
+    Returns:
+        dict: distance, avg_score, harsh_braking, harsh_acceleration,
+        swerving and over_speed; None where there is no data
+    """
+    from .models import DrivingData, DrivingDataDailyRollup
+
+    first_full_day = _day(since) + timedelta(days=1)
+    sums = {
+        'distance': Sum('distance'),
+        'harsh_braking': Sum('harsh_braking_events'),
+        'harsh_acceleration': Sum('harsh_acceleration_events'),
+        'swerving': Sum('swerving_events'),
+        'over_speed': Sum('over_speed_events'),
+    }
+    partial_day = DrivingData.objects.filter(
+        car_id__in=car_ids,
+        created_at__gte=since,
+        created_at__lt=timezone.make_aware(datetime.combine(first_full_day, time.min)),
+    ).aggregate(score_sum=Sum('score'), records=Count('id'), **sums)
+    full_days = DrivingDataDailyRollup.objects.filter(
+        car_id__in=car_ids,
+        day__gte=first_full_day,
+    ).aggregate(score_sum=Sum('score_sum'), records=Sum('records'), **sums)
+
+    totals = {}
+    for name in ('score_sum', 'records', *sums):
+        values = [part[name] for part in (partial_day, full_days) if part[name] is not None]
+        totals[name] = sum(values) if values else None
+    records = totals.pop('records')
+    score_sum = totals.pop('score_sum')
+    totals['avg_score'] = score_sum / records if records else None
+    return totals
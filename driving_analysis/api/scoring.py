@@ -0,0 +1,222 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Abs, Greatest
+from django.db.models.lookups import GreaterThan
+
+logger = logging.getLogger(__name__)
+
+# Weights (percent of a point per event) used when no ScorePattern applies
+DEFAULT_WEIGHTS = {
+    'harsh_braking_weight': 20,
+    'harsh_acceleration_weight': 10,
+    'swerving_weight': 30,
+    'over_speed_weight': 20,
+    'potential_swerving_weight': 0,
+}
+
+# Results key counted against each weight, in deduction order
+EVENT_WEIGHTS = (
+    ('harsh_braking_events', 'harsh_braking_weight'),
+    ('harsh_acceleration_events', 'harsh_acceleration_weight'),
+    ('swerving_events', 'swerving_weight'),
+    ('over_speed_events', 'over_speed_weight'),
+    ('potential_swerving_events', 'potential_swerving_weight'),
+)
+
+# Shared cache key changed whenever a score pattern changes, so every process drops its weights
+GENERATION_KEY = 'score_weights_generation'
+
+
+def score_events(results, weights):
+    """
+    Score a set of event counts with pre-resolved weights.
+
+    Args:
+        results (dict): Event counts (harsh_braking_events, ...)
+        weights (dict): Weight per event type, as in DEFAULT_WEIGHTS
+
+    Returns:
+        float: Score between 0 and 100
+    """
+    score = 100
+    for event, weight in EVENT_WEIGHTS:
+        score -= results[event] * (weights[weight] / 100)
+    return max(score, 0)
+
+
+def load_weights_many(car_ids):
+    """
+    Resolve the weights of several cars from the database: customer pattern
+    first, then company pattern, then the defaults. Two queries in total.
+
+    Returns:
+        dict: car_id -> (weights dict, source), source being 'customer', 'company'
+        or 'default'; unknown cars are left out
+    """
+    from .models import Car, ScorePattern
+
+    # Ids often arrive as strings from request data; results are keyed by int
+    car_ids = [int(car_id) for car_id in car_ids]
+    cars = list(Car.objects.filter(id__in=car_ids).values('id', 'customer_id', 'company_id'))
+    customer_ids = {car['customer_id'] for car in cars if car['customer_id']}
+    company_ids = {car['company_id'] for car in cars if car['company_id']}
+
+    # The lowest id wins, like .first()
+    customer_patterns, company_patterns = {}, {}
+    if customer_ids or company_ids:
+        patterns = ScorePattern.objects.filter(
+            Q(customer_id__in=customer_ids) | Q(company_id__in=company_ids)
+        ).order_by('id').values('customer_id', 'company_id', *DEFAULT_WEIGHTS)
+        for pattern in patterns:
+            if pattern['customer_id'] in customer_ids:
+                customer_patterns.setdefault(pattern['customer_id'], pattern)
+            if pattern['company_id'] in company_ids:
+                company_patterns.setdefault(pattern['company_id'], pattern)
+
+    resolved = {}
+    for car in cars:
+        for pattern, source in ((customer_patterns.get(car['customer_id']), 'customer'),
+                                (company_patterns.get(car['company_id']), 'company')):
+            if pattern is not None:
+                resolved[car['id']] = ({field: pattern[field] for field in DEFAULT_WEIGHTS}, source)
+                break
+        else:
+            resolved[car['id']] = (dict(DEFAULT_WEIGHTS), 'default')
+    return resolved
+
+
+def load_weights(car_id):
+    """Weights and source of a single car, see ``load_weights_many``."""
+    return load_weights_many([car_id]).get(int(car_id), (dict(DEFAULT_WEIGHTS), 'default'))
+
+
+def score_expression(weights):
+    """
+    Database expression computing ``score_events`` from a DrivingData row's event columns.
+
+    The deductions are applied in the same order as ``score_events``, so the
+    database computes the same floating point values.
+    """
+    score = Value(100.0)
+    for event, weight in EVENT_WEIGHTS:
+        score = score - F(event) * Value(weights[weight] / 100)
+    return Greatest(Value(0.0), score, output_field=FloatField())
+
+
+def rescore_driving_data(queryset, weights):
+    """
+    Rescore DrivingData rows with one UPDATE.
+
+    Only rows whose score changes by more than 0.01 are written.
+
+    Returns:
+        int: Number of updated rows
+    """
+    new_score = score_expression(weights)
+    return queryset.filter(GreaterThan(Abs(F('score') - new_score), 0.01)).update(score=new_score)
+
+
+class ScoreWeightCache:
+    """
+    Per-process cache of resolved weights, keyed by car id.
+
+    Entries expire after ``ttl`` seconds (covering cars moved to another
+    customer or company) and are all dropped as soon as ``invalidate`` is
+    called in any process; the shared generation key is checked at most
+    once per ``check_interval`` seconds.
+    """
+
+    def __init__(self, ttl=None, check_interval=1.0):
+        self.ttl = ttl if ttl is not None else getattr(settings, 'SCORE_WEIGHTS_TTL', 300)
+        self.check_interval = check_interval
+        self._weights = {}
+        self._lock = threading.Lock()
+        self._generation = None
+        self._last_check = 0.0
+
+    def get(self, car_id):
+        """Weights of a car (defaults when car_id is empty or unknown)."""
+        if not car_id:
+            return dict(DEFAULT_WEIGHTS)
+        try:
+            car_id = int(car_id)
+        except (TypeError, ValueError):
+            logger.warning(f"Invalid car id {car_id!r}, using default weights")
+            return dict(DEFAULT_WEIGHTS)
+        self._check_generation()
+
+        now = time.monotonic()
+        entry = self._weights.get(car_id)
+        if entry is not None and now - entry[1] < self.ttl:
+            return entry[0]
+
+        try:
+            weights, source = load_weights(car_id)
+            logger.debug(f"Using {source} score pattern for car {car_id}: {weights}")
+        except Exception as e:
+            logger.error(f"Error getting custom weights: {str(e)}")
+            return dict(DEFAULT_WEIGHTS)
+        with self._lock:
+            self._weights[car_id] = (weights, now)
+        return weights
+
+    def get_many(self, car_ids):
+        """Weights of several cars (keyed by int id), loading the missing ones in one go."""
+        car_ids = [int(car_id) for car_id in car_ids]
+        self._check_generation()
+        now = time.monotonic()
+        weights = {}
+        missing = []
+        for car_id in car_ids:
+            entry = self._weights.get(car_id)
+            if entry is not None and now - entry[1] < self.ttl:
+                weights[car_id] = entry[0]
+            else:
+                missing.append(car_id)
+
+        if missing:
+            resolved = load_weights_many(missing)
+            with self._lock:
+                for car_id in missing:
+                    car_weights = resolved.get(car_id, (dict(DEFAULT_WEIGHTS), 'default'))[0]
+                    self._weights[car_id] = (car_weights, now)
+                    weights[car_id] = car_weights
+        return weights
+
+    def invalidate(self):
+        """Drop every cached weight here and in every other process."""
+        with self._lock:
+            self._weights.clear()
+        self._generation = time.time_ns()
+        cache.set(GENERATION_KEY, self._generation, timeout=None)
+
+    def _check_generation(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        generation = cache.get(GENERATION_KEY)
+        if generation != self._generation:
+            with self._lock:
+                self._weights.clear()
+            self._generation = generation
+
+
+score_weights = ScoreWeightCache()
+
+
+def resolve_weights(car_id):
+    return score_weights.get(car_id)
+
+
+def resolve_weights_many(car_ids):
+    return score_weights.get_many(car_ids)
+
+
+def invalidate_score_weights():
+    score_weights.invalidate()
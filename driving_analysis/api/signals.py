@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .geofence_index import geofence_index
+from .models import Geofence
+
+
+@receiver(post_save, sender=Geofence)
+@receiver(post_delete, sender=Geofence)
+def invalidate_geofence_index(sender, **kwargs):
+    geofence_index.invalidate()
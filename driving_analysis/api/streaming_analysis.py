@@ -0,0 +1,200 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from .analysis import column_mapping
+from .detection import (
+    AX_VARIANCE_WINDOW, MAGNITUDE_WINDOW, NORMAL, RESET_WINDOW, SWERVE_WINDOW,
+    compute_features, count_events, label_codes, label_names, variance_threshold,
+)
+
+# A centered pandas window of size w covers [i - w // 2, i + (w - 1) // 2]
+HISTORY = max(RESET_WINDOW // 2, SWERVE_WINDOW // 2, AX_VARIANCE_WINDOW - 1, MAGNITUDE_WINDOW - 1)
+LOOKAHEAD = max((RESET_WINDOW - 1) // 2, (SWERVE_WINDOW - 1) // 2)
+
+# Raw columns carried between chunks
+STATE_COLUMNS = ['Ax', 'Ay', 'Az', 'Yaw', 'Speed(km/h)', 'acceleration_magnitude', 'distance']
+
+
+class RunningStats:
+    """Welford's online mean and sample variance, ignoring NaN values."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        # Merge the batch statistics (Chan et al.) instead of looping per value
+        n = len(values)
+        batch_mean = values.mean()
+        batch_m2 = ((values - batch_mean) ** 2).sum()
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += batch_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+    def mean_or_nan(self):
+        return self.mean if self.count else math.nan
+
+    def std(self):
+        """Sample standard deviation (ddof=1, like pandas), NaN below two values."""
+        if self.count < 2:
+            return math.nan
+        return math.sqrt(self._m2 / (self.count - 1))
+
+
+def _prepare(chunk):
+    """Rename to the analyze_data column names and make sure every state column exists."""
+    df = chunk.rename(columns={k: v for k, v in column_mapping.items() if k in chunk.columns})
+    if 'acceleration_magnitude' not in df:
+        df['acceleration_magnitude'] = np.sqrt(df['Ax'] ** 2 + df['Ay'] ** 2 + df['Az'] ** 2)
+    if 'distance' not in df:
+        df['distance'] = 0.0
+    return df[STATE_COLUMNS].reset_index(drop=True)
+
+
+def _features(df):
+    """Window features of analyze_data, computed over history + pending + new rows."""
+    return compute_features(
+        df['Ax'].to_numpy(dtype=np.float64),
+        df['Yaw'].to_numpy(dtype=np.float64),
+        df['acceleration_magnitude'].to_numpy(dtype=np.float64),
+    )
+
+
+class StreamingAnalyzer:
+    """
+    Stateful, per-device version of ``analyze_data``.
+
+    Chunks of any size are fed in order. Rolling and centered windows are
+    evaluated over the carried-over tail of earlier chunks, so events that
+    straddle chunk boundaries are neither lost nor counted twice. A sample is
+    labeled once the 44 samples after it have arrived (the right half of the
+    90-sample window); ``flush`` labels the remaining tail at end of stream.
+
+    The global means and standard deviations that analyze_data takes over a
+    whole batch are kept as running Welford statistics over every sample
+    received so far. Feeding a whole stream as one chunk (then ``flush``)
+    therefore gives exactly the labels of analyze_data on that stream; with
+    smaller chunks the thresholds of early samples use the statistics known
+    at the time they are labeled.
+    """
+
+    def __init__(self, device_name=None):
+        self.device_name = device_name
+        self._history = None  # Last HISTORY labeled rows
+        self._pending = None  # Rows waiting for their lookahead
+        self._previous_code = NORMAL
+        self._magnitude_stats = RunningStats()
+        self._negative_variance_stats = RunningStats()
+        self._positive_variance_stats = RunningStats()
+        self._detected_events = 0
+        self.samples = 0
+        self.totals = self._empty_results()
+
+    @staticmethod
+    def _empty_results():
+        return {
+            'detected_events': 0,
+            'harsh_braking_events': 0,
+            'harsh_acceleration_events': 0,
+            'swerving_events': 0,
+            'potential_swerving_events': 0,
+            'over_speed_events': 0,
+            'distance_km': 0.0,
+            'labels': [],
+        }
+
+    def feed(self, chunk):
+        """
+        Add a chunk of cleansed samples.
+
+        Args:
+            chunk (DataFrame): Cleansed data, in either ingest or CSV column names
+
+        Returns:
+            dict: Event counts and labels for the samples labeled by this call
+        """
+        if chunk is None or chunk.empty:
+            return self._empty_results()
+        new_rows = _prepare(chunk)
+        rows = new_rows if self._pending is None else pd.concat([self._pending, new_rows], ignore_index=True)
+        return self._process(rows, new_count=len(new_rows), final=False)
+
+    def pending(self):
+        """Samples still waiting for their lookahead (in analyze_data column names), or None."""
+        return self._pending
+
+    def flush(self):
+        """Label every pending sample; call once at the end of the stream."""
+        if self._pending is None or self._pending.empty:
+            return self._empty_results()
+        return self._process(self._pending, new_count=0, final=True)
+
+    def _process(self, rows, new_count, final):
+        history_len = 0 if self._history is None else len(self._history)
+        frame = rows if not history_len else pd.concat([self._history, rows], ignore_index=True)
+        features = _features(frame)
+
+        # The trailing-window features of new samples are final on arrival, so
+        # they enter the running statistics right away, as in the batch version
+        if new_count:
+            new_span = slice(len(frame) - new_count, len(frame))
+            self._magnitude_stats.update(frame['acceleration_magnitude'].to_numpy()[new_span])
+            self._negative_variance_stats.update(features['negative_ax_variance'][new_span])
+            self._positive_variance_stats.update(features['positive_ax_variance'][new_span])
+            mean_magnitude = self._magnitude_stats.mean_or_nan()
+            self._detected_events += int((features['magnitude_variance'][new_span] > mean_magnitude).sum())
+
+        ready = len(rows) if final else max(len(rows) - LOOKAHEAD, 0)
+        self._pending = rows.iloc[ready:].reset_index(drop=True)
+        if not ready:
+            return self._empty_results()
+
+        span = slice(history_len, history_len + ready)
+        ready_rows = frame.iloc[span]
+        ready_features = {name: values[span] for name, values in features.items()}
+
+        event_mask = ready_features['magnitude_variance'] > self._magnitude_stats.mean_or_nan()
+
+        codes = self._label(ready_rows, ready_features, event_mask)
+        results = self._count(codes, ready_rows)
+        results['detected_events'] = int(event_mask.sum())
+
+        self._history = frame.iloc[:history_len + ready].tail(HISTORY).reset_index(drop=True)
+        self.samples += ready
+        for key, value in results.items():
+            if key == 'labels':
+                self.totals['labels'].extend(value)
+            else:
+                self.totals[key] += value
+        return results
+
+    def _label(self, rows, features, event_mask):
+        braking_threshold = acceleration_threshold = None
+        if self._detected_events > 0:
+            braking_threshold = variance_threshold(
+                self._negative_variance_stats.mean_or_nan(), self._negative_variance_stats.std())
+            acceleration_threshold = variance_threshold(
+                self._positive_variance_stats.mean_or_nan(), self._positive_variance_stats.std())
+        return label_codes(
+            rows['Ax'].to_numpy(dtype=np.float64),
+            rows['Ay'].to_numpy(dtype=np.float64),
+            rows['Speed(km/h)'].to_numpy(dtype=np.float64),
+            features, event_mask, braking_threshold, acceleration_threshold,
+        )
+
+    def _count(self, codes, rows):
+        results = self._empty_results()
+        results.update(count_events(codes, self._previous_code))
+        self._previous_code = codes[-1]
+        results['distance_km'] = float(rows['distance'].sum())
+        results['labels'] = label_names(codes)
+        return results
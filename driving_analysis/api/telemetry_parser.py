@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+# Field layout of one ESP32 CSV line:
+# device_name,counter,timestamp,latitude,longitude,speed,ax,ay,az,yaw,accident
+FIELDS = ('device_name', 'counter', 'timestamp', 'latitude', 'longitude',
+          'speed', 'ax', 'ay', 'az', 'yaw', 'accident')
+FLOAT_FIELDS = ('latitude', 'longitude', 'speed', 'ax', 'ay', 'az', 'yaw')
+INT_FIELDS = ('counter', 'accident')
+MIN_FIELDS = len(FIELDS)
+
+
+class TelemetryBatch:
+    """
+    Columnar result of parsing one MQTT payload.
+
+    ``columns`` maps every name in FIELDS to a NumPy array holding the valid
+    lines in payload order; ``malformed`` counts the rejected lines per reason.
+    """
+
+    def __init__(self, columns, malformed):
+        self.columns = columns
+        self.malformed = malformed
+
+    def __len__(self):
+        return len(self.columns['device_name'])
+
+    @property
+    def malformed_count(self):
+        return sum(self.malformed.values())
+
+    def device_names(self):
+        """Distinct devices in the batch, in order of first appearance."""
+        names, first_seen = np.unique(self.columns['device_name'], return_index=True)
+        return [str(name) for name in names[np.argsort(first_seen)]]
+
+    def for_device(self, device_name):
+        """Column arrays restricted to the lines of one device."""
+        mask = self.columns['device_name'] == device_name
+        return {name: column[mask] for name, column in self.columns.items()}
+
+    def latest_per_device(self):
+        """Index of the last line of every device, keyed by device_name."""
+        names = self.columns['device_name']
+        # np.unique on the reversed array returns the first hit, i.e. the last line
+        unique_names, reverse_index = np.unique(names[::-1], return_index=True)
+        last_index = len(names) - 1 - reverse_index
+        return {str(name): int(i) for name, i in zip(unique_names, last_index)}
+
+    def to_dataframe(self):
+        return pd.DataFrame(self.columns)
+
+
+def _empty_columns():
+    columns = {
+        'device_name': np.empty(0, dtype=object),
+        'timestamp': np.empty(0, dtype=object),
+    }
+    for name in FLOAT_FIELDS:
+        columns[name] = np.empty(0, dtype=np.float64)
+    for name in INT_FIELDS:
+        columns[name] = np.empty(0, dtype=np.int64)
+    return columns
+
+
+def _parse_numeric(fields, dtype):
+    """
+    Convert a column of strings in one vectorized cast; empty fields become 0.
+
+    Returns:
+        tuple: (values, valid) where ``valid`` flags the entries that parsed
+    """
+    fields = np.char.strip(fields)
+    fields = np.where(fields == '', '0', fields)
+    try:
+        return fields.astype(dtype), np.ones(len(fields), dtype=bool)
+    except ValueError:
+        pass
+
+    # Slow path, only taken for a column that holds at least one bad value
+    values = np.zeros(len(fields), dtype=dtype)
+    valid = np.ones(len(fields), dtype=bool)
+    cast = int if dtype == np.int64 else float
+    for i, field in enumerate(fields):
+        try:
+            values[i] = cast(field)
+        except ValueError:
+            valid[i] = False
+    return values, valid
+
+
+def parse_payload(payload):
+    """
+    Parse a multi-line ESP32 payload into columnar NumPy arrays.
+
+    Args:
+        payload (bytes | str): Raw MQTT message body
+
+    Returns:
+        TelemetryBatch: Parsed columns plus counts of malformed lines
+    """
+    if isinstance(payload, (bytes, bytearray)):
+        payload = payload.decode(errors='replace')
+
+    lines = payload.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    rows = [line.split(',') for line in lines if line.strip()]
+
+    malformed = {'too_few_fields': 0, 'bad_number': 0}
+    if not rows:
+        return TelemetryBatch(_empty_columns(), malformed)
+
+    lengths = np.fromiter((len(row) for row in rows), dtype=np.int64, count=len(rows))
+    complete = lengths >= MIN_FIELDS
+    malformed['too_few_fields'] = int((~complete).sum())
+    if not complete.any():
+        return TelemetryBatch(_empty_columns(), malformed)
+
+    # Any extra trailing fields are ignored, as before
+    grid = np.array([row[:MIN_FIELDS] for row, ok in zip(rows, complete) if ok], dtype=str)
+
+    columns = {
+        'device_name': grid[:, 0].astype(object),
+        'timestamp': grid[:, 2].astype(object),
+    }
+    valid = np.ones(len(grid), dtype=bool)
+    for name in FLOAT_FIELDS + INT_FIELDS:
+        dtype = np.int64 if name in INT_FIELDS else np.float64
+        columns[name], parsed = _parse_numeric(grid[:, FIELDS.index(name)], dtype)
+        valid &= parsed
+
+    malformed['bad_number'] = int((~valid).sum())
+    if not valid.all():
+        columns = {name: column[valid] for name, column in columns.items()}
+
+    return TelemetryBatch(columns, malformed)
@@ -0,0 +1,231 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Max, Min
+
+# A gap longer than this between two segments of a car starts a new trip
+TRIP_GAP = timedelta(minutes=10)
+
+# DrivingData columns read for trip segmentation, in tuple order
+TRIP_FIELDS = (
+    'car_id',
+    'created_at',
+    'distance',
+    'score',
+    'harsh_braking_events',
+    'harsh_acceleration_events',
+    'swerving_events',
+    'over_speed_events',
+)
+
+# Rows fetched per database round trip while streaming
+TRIP_CHUNK_SIZE = 2000
+
+
+# Totals kept per trip, named as the Trip model fields
+TOTAL_FIELDS = (
+    'segments',
+    'distance',
+    'score_sum',
+    'harsh_braking_events',
+    'harsh_acceleration_events',
+    'swerving_events',
+    'over_speed_events',
+)
+
+
+class TripTotals:
+    """Running totals of one trip; segments are added in created_at order."""
+
+    __slots__ = ('pk', 'car_id', 'start_time', 'end_time') + TOTAL_FIELDS
+
+    def __init__(self, car_id, start_time, pk=None):
+        self.pk = pk
+        self.car_id = car_id
+        self.start_time = start_time
+        self.end_time = start_time
+        for field in TOTAL_FIELDS:
+            setattr(self, field, 0)
+
+    @classmethod
+    def from_trip(cls, trip):
+        """Totals of a stored Trip, to extend it with new segments."""
+        totals = cls(trip.car_id_id, trip.start_time, pk=trip.pk)
+        totals.end_time = trip.end_time
+        for field in TOTAL_FIELDS:
+            setattr(totals, field, getattr(trip, field))
+        return totals
+
+    def to_trip(self):
+        from .models import Trip
+        return Trip(pk=self.pk, car_id_id=self.car_id, start_time=self.start_time, end_time=self.end_time,
+                    **{field: getattr(self, field) for field in TOTAL_FIELDS})
+
+    def add(self, created_at, distance, score, harsh_braking, harsh_acceleration, swerving, over_speed):
+        self.end_time = created_at
+        self.segments += 1
+        self.distance += distance
+        self.score_sum += score
+        self.harsh_braking_events += harsh_braking
+        self.harsh_acceleration_events += harsh_acceleration
+        self.swerving_events += swerving
+        self.over_speed_events += over_speed
+
+    def continues_with(self, car_id, created_at):
+        return car_id == self.car_id and created_at - self.end_time <= TRIP_GAP
+
+    def summary(self, car):
+        """Trip dict returned by get_car_trips."""
+        duration = (self.end_time - self.start_time).total_seconds() / 60  # minutes
+        avg_score = self.score_sum / self.segments if self.segments else 0
+        return {
+            'trip_id': f"{car.id}-{self.start_time.strftime('%Y%m%d%H%M%S')}",
+            'car_id': car.id,
+            'car_model': car.Model_of_car,
+            'plate_number': car.Plate_number,
+            'start_time': self.start_time.isoformat(),
+            'end_time': self.end_time.isoformat(),
+            'duration_minutes': round(duration, 1),
+            'distance_km': round(self.distance, 2),
+            'score': round(avg_score, 1),
+            'events': {
+                'harsh_braking': self.harsh_braking_events,
+                'harsh_acceleration': self.harsh_acceleration_events,
+                'swerving': self.swerving_events,
+                'over_speed': self.over_speed_events
+            }
+        }
+
+
+def segment_trips(rows, open_trips=None):
+    """
+    Split a stream of segments into trips in one pass.
+
+    Only the trip being built is held in memory, so the stream can come
+    straight from ``values_list(*TRIP_FIELDS).iterator()``.
+
+    Args:
+        rows (iterable): Tuples in TRIP_FIELDS order, sorted by car then created_at
+        open_trips (dict): car_id -> TripTotals of the car's last stored trip,
+            which the first segments of that car may extend
+
+    Yields:
+        TripTotals: Each trip once its last segment has been read
+    """
+    open_trips = dict(open_trips or {})
+    trip = None
+    for car_id, created_at, *values in rows:
+        if trip is None or not trip.continues_with(car_id, created_at):
+            if trip is not None:
+                yield trip
+            trip = open_trips.pop(car_id, None)
+            if trip is None or not trip.continues_with(car_id, created_at):
+                trip = TripTotals(car_id, created_at)
+        trip.add(created_at, *values)
+    if trip is not None:
+        yield trip
+
+
+def stream_trips(queryset, open_trips=None):
+    """Trips of a DrivingData queryset, streamed without loading model instances."""
+    rows = queryset.order_by('car_id', 'created_at').values_list(*TRIP_FIELDS).iterator(chunk_size=TRIP_CHUNK_SIZE)
+    return segment_trips(rows, open_trips)
+
+
+def _last_trips(car_ids, before=None):
+    """TripTotals of the last stored trip of each car (ending before ``before`` if given)."""
+    from .models import Trip
+
+    last_trips = {}
+    for car_id in car_ids:
+        trips = Trip.objects.filter(car_id_id=car_id)
+        if before is not None:
+            trips = trips.filter(end_time__lt=before)
+        trip = trips.order_by('-end_time').first()
+        if trip is not None:
+            last_trips[car_id] = TripTotals.from_trip(trip)
+    return last_trips
+
+
+def _save_trips(trips):
+    """Update the extended stored trips and create the new ones."""
+    from .models import Trip
+
+    new_trips = []
+    for totals in trips:
+        if totals.pk is None:
+            new_trips.append(totals.to_trip())
+        else:
+            totals.to_trip().save(update_fields=('end_time',) + TOTAL_FIELDS)
+    Trip.objects.bulk_create(new_trips, batch_size=1000)
+    return len(new_trips)
+
+
+def add_to_trips(rows):
+    """
+    Extend or open the trips of freshly stored DrivingData rows.
+
+    The first segments of a car extend its last stored trip when they follow
+    it within TRIP_GAP; later gaps open new trips. Call it in the transaction
+    that stored the rows.
+
+    Args:
+        rows (list): Saved DrivingData instances (created_at set)
+    """
+    segments = sorted(
+        (tuple(getattr(row, 'car_id_id' if field == 'car_id' else field) for field in TRIP_FIELDS) for row in rows),
+        key=lambda segment: (segment[0], segment[1]),
+    )
+    open_trips = _last_trips({segment[0] for segment in segments})
+    _save_trips(segment_trips(segments, open_trips))
+
+
+def _rebuild_car_trips(car_id, since, until):
+    """Rebuild the trips of one car, see ``rebuild_trips``."""
+    from .models import DrivingData, Trip
+
+    data = DrivingData.objects.filter(car_id=car_id)
+    if since is None:
+        since = data.aggregate(first=Min('created_at'))['first']
+        if since is None:
+            return 0
+
+    # Widen the range to the car's trips it cuts through
+    trips = Trip.objects.filter(car_id=car_id, end_time__gte=since)
+    if until is not None:
+        trips = trips.filter(start_time__lte=until)
+    bounds = trips.aggregate(first=Min('start_time'), last=Max('end_time'))
+    if bounds['first'] is not None:
+        since = min(since, bounds['first'])
+        until = max(until, bounds['last']) if until is not None else None
+
+    data = data.filter(created_at__gte=since)
+    if until is not None:
+        data = data.filter(created_at__lte=until)
+    trips.delete()
+    return _save_trips(stream_trips(data, _last_trips({car_id}, before=since)))
+
+
+def rebuild_trips(car_ids=None, since=None, until=None):
+    """
+    Regenerate stored trips from the raw DrivingData rows.
+
+    For each car, trips overlapping [since, until] are deleted and rebuilt
+    from the rows they and the range cover, continuing the car's last trip
+    kept before them. The range is widened per car, so rebuilding one car's
+    long trip doesn't touch the other cars' earlier trips.
+
+    Args:
+        car_ids (list): Cars to rebuild, None for every car
+        since, until (datetime): Range to rebuild; None for no bound (since
+            None starts at each car's oldest raw data, so trips of pruned data are kept)
+
+    Returns:
+        int: Number of trips created
+    """
+    from .models import DrivingData
+
+    if car_ids is None:
+        car_ids = DrivingData.objects.order_by().values_list('car_id', flat=True).distinct()
+    with transaction.atomic():
+        return sum(_rebuild_car_trips(car_id, since, until) for car_id in set(car_ids))
@@ -1,12 +1,13 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
 import folium
 from django.core.cache import cache
-from .models import DrivingData, Customer, Company, Car, Driver, ScorePattern
+from django.db.models import Case, Count, OuterRef, Q, Subquery, Value, When
+from .models import DrivingData, Trip, Customer, Company, Car, Driver, ScorePattern
 from .forms import CustomerForm, CompanyForm, CarForm, DriverForm, DrivingDataForm, ScorePattern
 from .models import DrivingData, Customer, Company, Car, Driver,Employee
 from .forms import CustomerForm, CompanyForm, CarForm, DriverForm,DrivingDataForm,EmployeeForm
-from .cleansing_data import cleanse_data
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
@@ -15,66 +16,37 @@ import time  # Add this import for time.time()
 from django.contrib.auth.hashers import check_password  # Add this for password checking
 from django.contrib.auth.hashers import make_password
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
 import uuid
 from datetime import timedelta
 from django.core.mail import send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
 from datetime import timedelta
-import os
+import zlib
 # Add these imports at the top of your views.py
 from .models import Geofence
 from .forms import GeofenceForm
-import math
 from .models import Geofence, Car
+from .geofence_index import geofence_index
+from .live_feed import live_broker, snapshot_relay
+from .location_store import latest_positions
+from .overview_cache import bump_data_generation, data_generation, get_overview, overview_key, set_overview
+from .rollups import add_to_rollups, rebuild_rollups, window_totals
+from .trips import TripTotals, add_to_trips, rebuild_trips
+from .scoring import (
+    invalidate_score_weights, rescore_driving_data, resolve_weights, resolve_weights_many, score_events,
+)
 import pandas as pd
 
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371000
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
-    return R * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-
-def point_in_circle(lat, lon, center, radius):
-    return haversine(lat, lon, center[0], center[1]) <= radius
-
-def point_in_polygon(lat, lon, polygon):
-    x, y = lon, lat
-    inside = False
-    n = len(polygon)
-    p1x, p1y = polygon[0][1], polygon[0][0]
-    for i in range(n+1):
-        p2x, p2y = polygon[i % n][1], polygon[i % n][0]
-        if min(p1y, p2y) < y <= max(p1y, p2y):
-            if x <= max(p1x, p2x):
-                xinters = (y-p1y)*(p2x-p1x)/(p2y-p1y+1e-10)+p1x if p1y != p2y else p1x
-                if p1x == p2x or x <= xinters:
-                    inside = not inside
-        p1x, p1y = p2x, p2y
-    return inside
-
 def check_geofence_for_car(car, lat, lon):
-    geofences = Geofence.objects.filter(active=True).filter(
-        company_id=car['company_id']
-    ) | Geofence.objects.filter(active=True).filter(
-        customer_id=car['customer_id']
-    )
-    if not geofences.exists():
+    # None when the car has no active geofence, True when it is inside one of them
+    inside = geofence_index.inside_any(car['company_id'], car['customer_id'], lat, lon)
+    if inside is None or inside:
         return None
+    return build_geofence_alert(car, lat, lon)
 
-    for geofence in geofences:
-        coords = geofence.get_coordinates()
-        if geofence.type == 'circle':
-            center = coords
-            radius = geofence.radius
-            if point_in_circle(lat, lon, center, radius):
-                return None
-        elif geofence.type == 'polygon':
-            if point_in_polygon(lat, lon, coords):
-                return None
+def build_geofence_alert(car, lat, lon):
     print(f"GEOFENCE VIOLATION: Car {car['Model_of_car']} ({car['Plate_number']}) is outside its geofence!")
     return {
         'type': 'geofence',
@@ -87,10 +59,9 @@ def check_geofence_for_car(car, lat, lon):
     }
 
 
-LOCATION_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'location_data')
-
 from django.http import JsonResponse
 from django.core.cache import cache
+from django.db import transaction
 
 def get_latest_data(request):
     latest_location = cache.get('latest_location')
@@ -561,7 +532,7 @@ def create_car(request):
                 
                 # Create initial DrivingData record for this car
                 try:
-                    DrivingData.objects.create(
+                    initial_data = DrivingData.objects.create(
                         car_id=car,
                         speed=0,
                         accident_detection=False,
@@ -573,6 +544,9 @@ def create_car(request):
                         over_speed_events=0,
                         score=100  # Start with perfect score
                     )
+                    add_to_rollups([initial_data])
+                    add_to_trips([initial_data])
+                    bump_data_generation()
                     print(f"Created initial driving data for car ID {car.id}")
                 except Exception as e:
                     print(f"Error creating initial driving data: {str(e)}")
@@ -837,6 +811,7 @@ def create_driving_data(request):
                 over_speed_events=analysis_results.get('over_speed_events', 0),
                 score=analysis_results.get('score', 100)
             )
+            bump_data_generation()
             print("Data saved to database")
 
             # Return a success response
@@ -847,12 +822,22 @@ def create_driving_data(request):
         return JsonResponse({'errors': 'Invalid request method'}, status=400)
 
 
+def refresh_driving_data_summaries(car_ids, created_at):
+    """Rebuild the rollups and the trip of DrivingData rows changed in place or deleted."""
+    car_ids = [car_id for car_id in set(car_ids) if car_id is not None]
+    rebuild_rollups(car_ids, since=created_at)
+    rebuild_trips(car_ids, since=created_at, until=created_at)
+
 def update_driving_data(request, driving_data_id):
     driving_data = get_object_or_404(DrivingData, pk=driving_data_id)
     if request.method == 'POST':
+        previous_car_id = driving_data.car_id_id
         form = DrivingDataForm(request.POST, instance=driving_data)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                driving_data = form.save()
+                refresh_driving_data_summaries([previous_car_id, driving_data.car_id_id], driving_data.created_at)
+            bump_data_generation()
             return JsonResponse({'message': 'Driving data updated successfully'}, status=200)
     else:
         form = DrivingDataForm(instance=driving_data)
@@ -861,24 +846,15 @@ def update_driving_data(request, driving_data_id):
 def delete_driving_data(request, driving_data_id):
     driving_data = get_object_or_404(DrivingData, pk=driving_data_id)
     if request.method == 'POST':
-        driving_data.delete()
+        with transaction.atomic():
+            driving_data.delete()
+            refresh_driving_data_summaries([driving_data.car_id_id], driving_data.created_at)
+        bump_data_generation()
         return JsonResponse({'message': 'Driving data deleted successfully'}, status=200)
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
-def cleanse_buffer_view(request):
-    cleansed_buffer = cache.get('cleansed_buffer', [])  # Retrieve cleansed_buffer from cache
-    buffer = cache.get('buffer', [])  # Retrieve buffer from cache
-    if buffer:
-        cleaned_data = cleanse_data(buffer)
-        cleansed_buffer.extend(cleaned_data.to_dict('records'))
-        cache.set('cleansed_buffer', cleansed_buffer, timeout=None)
-        cache.set('buffer', [], timeout=None)
-        return HttpResponse("Buffer cleansed successfully. Check console for details.")
-    else:
-        return HttpResponse("Buffer is empty. No data to cleanse.")
-
 def get_cleansed_data(request):
-    cleansed_buffer = cache.get('cleansed_buffer', [])  # Retrieve cleansed_buffer from cache
+    cleansed_buffer = cache.get('cleansed_buffer', [])  # Latest cleansed window of the ingest pipeline
     return JsonResponse(cleansed_buffer, safe=False)
 
 def get_analysis_results(request):
@@ -1851,36 +1827,70 @@ def create_geofence(request):
         traceback.print_exc()
         return JsonResponse({'error': str(e)}, status=500)
 
+def fleet_location_headers(response, etag=None):
+    if etag is not None:
+        response["ETag"] = etag
+    # Always revalidate, so the browser sends If-None-Match on every poll
+    response["Cache-Control"] = "no-cache"
+    response["Access-Control-Allow-Origin"] = "http://https://driving-analysis.netlify.app/"
+    response["Access-Control-Allow-Methods"] = "GET, OPTIONS"
+    response["Access-Control-Allow-Headers"] = "Content-Type, Authorization, If-None-Match"
+    response["Access-Control-Expose-Headers"] = "ETag"
+    return response
+
+LOCATION_CAR_FIELDS = ('id', 'device_id', 'Model_of_car', 'Plate_number', 'company_id', 'customer_id')
+
+def location_cars(user_type, user_id):
+    """Cars visible to a user on the tracking page, as a single query."""
+    if user_type == 'company' and user_id:
+        return Car.objects.filter(company_id=user_id)
+    if user_type in ['employee', 'admin'] and user_id:
+        # Employees see their company's cars; none when they have no company or don't exist
+        return Car.objects.filter(company_id__in=Employee.objects.filter(id=user_id).values('company_id'))
+    if user_type == 'customer' and user_id:
+        return Car.objects.filter(customer_id=user_id)
+    return Car.objects.all()
+
+def fleet_location_etag(cars):
+    """ETag of the fleet locations: changes with any position, geofence, car or driving data change."""
+    car_crc = zlib.crc32(repr(cars).encode())
+    return f'"{latest_positions.version()}-{geofence_index.generation()}-{data_generation()}-{car_crc:08x}"'
+
+def fleet_location_changes(cars, since):
+    """
+    Positions of the cars that moved after the ``since`` sequence number, as parallel arrays.
+
+    The returned ``seq`` is the cursor for the next poll; ``since=0`` returns
+    every located car along with its model and plate.
+    """
+    seq, changed = latest_positions.changes_since(since, [car['device_id'] for car in cars])
+    moved = [car for car in cars if car['device_id'] in changed]
+    positions = [changed[car['device_id']] for car in moved]
+    lat = [position['latitude'] for position in positions]
+    lon = [position['longitude'] for position in positions]
+    inside = geofence_index.inside_fleet([(car['company_id'], car['customer_id']) for car in moved], lat, lon)
+    data = {
+        'seq': seq,
+        'id': [car['id'] for car in moved],
+        'device_id': [car['device_id'] for car in moved],
+        'lat': lat,
+        'lon': lon,
+        'speed': [position.get('speed', 0) for position in positions],
+        # null when the car has no active geofence
+        'outside': [None if value is None else not value for value in inside],
+    }
+    if since == 0:
+        data['model'] = [car['Model_of_car'] for car in moved]
+        data['plate'] = [car['Plate_number'] for car in moved]
+    return data
+
 @csrf_exempt
 def get_car_location(request, car_id=None):
     try:
         user_type = request.GET.get('userType')
         user_id = request.GET.get('userId')
 
-        # Filter cars based on user type
-        if user_type == 'company' and user_id:
-            cars = list(Car.objects.filter(company_id=user_id).values(
-                'id', 'device_id', 'Model_of_car', 'Plate_number', 'company_id', 'customer_id'
-            ))
-        elif user_type in ['employee', 'admin'] and user_id:
-            try:
-                employee = Employee.objects.get(id=user_id)
-                if employee.company_id:
-                    cars = list(Car.objects.filter(company_id=employee.company_id.id).values(
-                        'id', 'device_id', 'Model_of_car', 'Plate_number', 'company_id', 'customer_id'
-                    ))
-                else:
-                    cars = []
-            except Employee.DoesNotExist:
-                cars = []
-        elif user_type == 'customer' and user_id:
-            cars = list(Car.objects.filter(customer_id=user_id).values(
-                'id', 'device_id', 'Model_of_car', 'Plate_number', 'company_id', 'customer_id'
-            ))
-        else:
-            cars = list(Car.objects.all().values(
-                'id', 'device_id', 'Model_of_car', 'Plate_number', 'company_id', 'customer_id'
-            ))
+        cars = list(location_cars(user_type, user_id).values(*LOCATION_CAR_FIELDS))
 
         if car_id:
             # Single car lookup (not used in most tracking pages)
@@ -1888,16 +1898,7 @@ def get_car_location(request, car_id=None):
             if not car:
                 return JsonResponse({'error': 'Car not found'}, status=404)
             device_id = car['device_id']
-            location_file = os.path.join(LOCATION_DIR, f'location_{device_id}.json')
-            latest_location = None
-            if os.path.exists(location_file):
-                try:
-                    with open(location_file, 'r') as f:
-                        latest_location = json.load(f)
-                except Exception as e:
-                    print(f"Error reading location file: {e}")
-            if not latest_location:
-                latest_location = cache.get(f'latest_location_{device_id}')
+            latest_location = latest_positions.get(device_id)
             if latest_location:
                 return JsonResponse({
                     'latitude': latest_location['latitude'],
@@ -1917,23 +1918,41 @@ def get_car_location(request, car_id=None):
                     'model': car['Model_of_car'],
                     'plate': car['Plate_number']
                 })
+        elif request.GET.get('since') is not None:
+            # Delta mode: only the cars that moved after the client's cursor
+            try:
+                since = int(request.GET['since'])
+            except ValueError:
+                return JsonResponse({'error': 'since must be an integer sequence number'}, status=400)
+            return fleet_location_headers(JsonResponse(fleet_location_changes(cars, since)))
         else:
+            # Pollers that already have this state get a 304 without a body
+            etag = fleet_location_etag(cars)
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return fleet_location_headers(not_modified, etag)
+
             # Return all cars with their locations or default coordinates
             car_locations = []
+            # One bulk lookup for the whole fleet
+            positions = latest_positions.get_many([car['device_id'] for car in cars])
+            # Geofences of the whole fleet in one batch: None (no fence) / True (inside) per located car
+            located = [car for car in cars if positions.get(car['device_id'])]
+            inside = dict(zip(
+                (car['id'] for car in located),
+                geofence_index.inside_fleet(
+                    [(car['company_id'], car['customer_id']) for car in located],
+                    [positions[car['device_id']]['latitude'] for car in located],
+                    [positions[car['device_id']]['longitude'] for car in located],
+                ),
+            ))
             for car in cars:
                 device_id = car['device_id']
-                location_data = None
-                location_file = os.path.join(LOCATION_DIR, f'location_{device_id}.json')
-                if os.path.exists(location_file):
-                    try:
-                        with open(location_file, 'r') as f:
-                            location_data = json.load(f)
-                    except Exception as e:
-                        print(f"Error reading location file for device {device_id}: {e}")
-                if not location_data:
-                    location_data = cache.get(f'latest_location_{device_id}')
+                location_data = positions.get(device_id)
                 if location_data:
-                    geofence_alert = check_geofence_for_car(car, location_data['latitude'], location_data['longitude'])
+                    alert = None
+                    if inside[car['id']] is False:
+                        alert = build_geofence_alert(car, location_data['latitude'], location_data['longitude'])
                     car_locations.append({
                         'id': car['id'],
                         'latitude': location_data['latitude'],
@@ -1942,7 +1961,7 @@ def get_car_location(request, car_id=None):
                         'device_id': device_id,
                         'model': car['Model_of_car'],
                         'plate': car['Plate_number'],
-                        'geofence_alert': geofence_alert
+                        'geofence_alert': alert
                     })
                 else:
                     car_locations.append({
@@ -1955,16 +1974,59 @@ def get_car_location(request, car_id=None):
                         'plate': car['Plate_number'],
                         'geofence_alert': None
                     })
-            response = JsonResponse(car_locations, safe=False)
-            response["Access-Control-Allow-Origin"] = "http://https://driving-analysis.netlify.app/"
-            response["Access-Control-Allow-Methods"] = "GET, OPTIONS"
-            response["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
-            return response
+            return fleet_location_headers(JsonResponse(car_locations, safe=False), etag)
 
     except Exception as e:
         print(f"Error in get_car_location: {str(e)}")
         return JsonResponse({'error': str(e)}, status=500)
     
+@csrf_exempt
+async def get_live_feed(request):
+    """
+    Server-Sent Events stream of the positions and events of the user's cars.
+
+    Only served under ASGI (see start.sh); under WSGI every open stream
+    would hold a worker, so it answers 501. Positions are coalesced per car
+    to at most ``maxRate`` batches per second (LIVE_FEED_MAX_RATE by
+    default). Each message's data is a JSON list of updates. Clients that
+    reconnect can catch up with ``get_car_location?since=<seq>`` using the
+    last position ``seq`` they saw.
+    """
+    if getattr(request, 'scope', None) is None:
+        return JsonResponse({'error': 'The live feed needs the ASGI server (driving_analysis.asgi)'}, status=501)
+
+    user_type = request.GET.get('userType')
+    user_id = request.GET.get('userId')
+    try:
+        max_rate = float(request.GET.get('maxRate') or settings.LIVE_FEED_MAX_RATE)
+    except ValueError:
+        return JsonResponse({'error': 'maxRate must be a number'}, status=400)
+    if max_rate <= 0:
+        return JsonResponse({'error': 'maxRate must be positive'}, status=400)
+
+    device_ids = await sync_to_async(list)(location_cars(user_type, user_id).values_list('device_id', flat=True))
+    subscription = live_broker.subscribe(device_ids, min_interval=1 / max_rate)
+    snapshot_relay.ensure_running()
+
+    async def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                batch = await subscription.next_batch(timeout=settings.LIVE_FEED_KEEPALIVE or None)
+                if batch:
+                    yield f'data: {json.dumps(batch)}\n\n'
+                else:
+                    # Comment line, so proxies keep the idle connection open
+                    yield ': keep-alive\n\n'
+        finally:
+            live_broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+    
 @csrf_exempt
 def get_company(request, company_id):
     """Get details for a specific company"""
@@ -2048,58 +2110,49 @@ def get_fleet_overview(request):
     try:
         # Get time frame parameter
         time_frame = request.GET.get('time_frame', '1d')
+        if time_frame not in ('1d', '7d', '30d'):
+            time_frame = '1d'  # Default to 1 day
         
         # Get company_id filter if available
         company_id = request.GET.get('company_id')
         
+        # Served from the cache until the TTL runs out or new driving data is stored
+        cache_key = overview_key('fleet_overview', company_id, time_frame)
+        overview_data = get_overview(cache_key)
+        if overview_data is not None:
+            return JsonResponse(overview_data)
+        
         # Determine date range based on time frame
         now = timezone.now()
-        if time_frame == '1d':
-            start_date = now - timedelta(days=1)
-        elif time_frame == '7d':
-            start_date = now - timedelta(days=7)
-        elif time_frame == '30d':
-            start_date = now - timedelta(days=30)
-        else:
-            start_date = now - timedelta(days=1)  # Default to 1 day
+        start_date = now - timedelta(days=int(time_frame[:-1]))
         
         # Get cars filtered by company if specified
         cars_queryset = Car.objects.all()
         if company_id:
             cars_queryset = cars_queryset.filter(company_id=company_id)
         
-        total_cars = cars_queryset.count()
-        active_cars = cars_queryset.filter(State_of_car='online').count()
-        inactive_cars = cars_queryset.filter(State_of_car='offline').count()
+        car_counts = cars_queryset.aggregate(
+            total=Count('id'),
+            active=Count('id', filter=Q(State_of_car='online')),
+            inactive=Count('id', filter=Q(State_of_car='offline')),
+        )
+        total_cars = car_counts['total']
+        active_cars = car_counts['active']
+        inactive_cars = car_counts['inactive']
         maintenance_cars = 0  # Default to 0 as we don't track maintenance separately yet
         
-        # Get the latest driving data records for analysis with time filter
+        # Aggregate the driving data of the time frame in the database; whole
+        # days are read from the daily rollups, the first partial day from raw rows
         car_ids = cars_queryset.values_list('id', flat=True)
-        latest_data = DrivingData.objects.filter(
-            car_id__in=car_ids,
-            created_at__gte=start_date
-        ).order_by('-created_at')
-        
-        # Calculate aggregate statistics - initialize with defaults
-        total_distance = 0
-        avg_score = 0
-        total_harsh_braking = 0
-        total_harsh_acceleration = 0
-        total_swerving = 0
-        total_over_speed = 0
-        
-        # Calculate metrics from data if available
-        if latest_data.exists():
-            total_distance = sum(data.distance for data in latest_data)
-            total_score = sum(data.score for data in latest_data)
-            count_records = latest_data.count()
-            avg_score = total_score / count_records if count_records > 0 else 0
-            
-            # Count events
-            total_harsh_braking = sum(data.harsh_braking_events for data in latest_data)
-            total_harsh_acceleration = sum(data.harsh_acceleration_events for data in latest_data)
-            total_swerving = sum(data.swerving_events for data in latest_data)
-            total_over_speed = sum(data.over_speed_events for data in latest_data)
+        totals = window_totals(car_ids, start_date)
+        
+        # Empty time frames aggregate to None
+        total_distance = totals['distance'] or 0
+        avg_score = totals['avg_score'] or 0
+        total_harsh_braking = totals['harsh_braking'] or 0
+        total_harsh_acceleration = totals['harsh_acceleration'] or 0
+        total_swerving = totals['swerving'] or 0
+        total_over_speed = totals['over_speed'] or 0
         
         # Create historical scores data (same implementation as before)
         historical_scores = []
@@ -2125,60 +2178,46 @@ def get_fleet_overview(request):
             'historical_scores': historical_scores
         }
         
-        # Process drivers data
+        # Latest score of each driver's car in the time frame, with the car
+        # fields and the performance bucket, in a single query
+        latest_score = DrivingData.objects.filter(
+            car_id=OuterRef('car_id'),
+            created_at__gte=start_date
+        ).order_by('-created_at', '-id').values('score')[:1]
         drivers = Driver.objects.filter(car_id__isnull=False)
         if company_id:
             drivers = drivers.filter(company_id=company_id)
-            
-        # Initialize counters
-        excellent = 0
-        good = 0
-        average = 0
-        poor = 0
-        drivers_data = []
+        drivers = drivers.annotate(score=Subquery(latest_score)).filter(score__isnull=False).annotate(
+            performance=Case(
+                When(score__gte=90, then=Value('excellent')),
+                When(score__gte=80, then=Value('good')),
+                When(score__gte=70, then=Value('average')),
+                default=Value('poor'),
+            )
+        ).order_by('id').values(
+            'id', 'name', 'car_id', 'score', 'performance', 'car_id__Model_of_car', 'car_id__Plate_number'
+        )
 
-        # Loop through drivers to categorize performance
+        performance_counts = {'excellent': 0, 'good': 0, 'average': 0, 'poor': 0}
+        drivers_data = []
         for driver in drivers:
-            try:
-                # Get driving data for the driver's car
-                car_data = DrivingData.objects.filter(
-                    car_id=driver.car_id.id, 
-                    created_at__gte=start_date
-                ).order_by('-created_at').first()
-                
-                if car_data:
-                    score = car_data.score
-                    # Categorize by score
-                    if score >= 90:
-                        excellent += 1
-                    elif score >= 80:
-                        good += 1
-                    elif score >= 70:
-                        average += 1
-                    else:
-                        poor += 1
-                        
-                    # Add to driver data list
-                    drivers_data.append({
-                        'id': driver.id,
-                        'name': driver.name,
-                        'car_id': driver.car_id.id,
-                        'score': score,
-                        'model': driver.car_id.Model_of_car,
-                        'plate': driver.car_id.Plate_number
-                    })
-            except Exception as e:
-                print(f"Error processing driver {driver.id}: {str(e)}")
+            performance_counts[driver['performance']] += 1
+            drivers_data.append({
+                'id': driver['id'],
+                'name': driver['name'],
+                'car_id': driver['car_id'],
+                'score': driver['score'],
+                'model': driver['car_id__Model_of_car'],
+                'plate': driver['car_id__Plate_number']
+            })
                 
         # Add to response
         overview_data['drivers'] = {
-            'excellent': excellent,
-            'good': good,
-            'average': average,
-            'poor': poor,
+            **performance_counts,
             'all_drivers': drivers_data
         }
         
+        set_overview(cache_key, overview_data)
         return JsonResponse(overview_data)
     except Exception as e:
         print(f"Error in get_fleet_overview: {str(e)}")
@@ -2186,65 +2225,14 @@ def get_fleet_overview(request):
     
 
 def score_chunk(chunk_df, results, car_id=None):
-    """Score the driving behavior with custom weights if available"""
-    from .models import Car, ScorePattern
-    
-    # Initialize score to 100%
-    score = 100
-    
-    # Try to get custom scoring pattern for this car
-    custom_weights = None
-    
-    if car_id:
-        try:
-            car = Car.objects.get(id=car_id)
-            
-            # First check if there's a customer-specific pattern
-            if car.customer_id:
-                custom_weights = ScorePattern.objects.filter(customer_id=car.customer_id).first()
-                print(f"Using customer {car.customer_id.id} score pattern for car {car_id}")
-            
-            # If no customer-specific pattern, try company pattern
-            if not custom_weights and car.company_id:
-                custom_weights = ScorePattern.objects.filter(company_id=car.company_id).first()
-                print(f"Using company {car.company_id.id} score pattern for car {car_id}")
-                
-            if custom_weights:
-                print(f"Custom weights found: harsh_braking={custom_weights.harsh_braking_weight}, "
-                      f"harsh_acceleration={custom_weights.harsh_acceleration_weight}, "
-                      f"swerving={custom_weights.swerving_weight}, "
-                      f"over_speed={custom_weights.over_speed_weight}")
-            else:
-                print(f"No custom weights found for car {car_id}")
-        except Exception as e:
-            print(f"Error getting custom weights: {str(e)}")
-    
-    # Define weights - use custom ones if available, otherwise defaults
-    if custom_weights:
-        harsh_braking_weight = custom_weights.harsh_braking_weight
-        harsh_acceleration_weight = custom_weights.harsh_acceleration_weight
-        swerving_weight = custom_weights.swerving_weight
-        overspeed_weight = custom_weights.over_speed_weight
-        potential_swerving_weight = custom_weights.potential_swerving_weight
-    else:
-        # Default weights
-        harsh_braking_weight = 20
-        harsh_acceleration_weight = 10
-        swerving_weight = 30
-        overspeed_weight = 20
-        potential_swerving_weight = 0
-
-    # Apply scoring deductions based on detected events and weights
-    score -= results['harsh_braking_events'] * (harsh_braking_weight / 100)
-    score -= results['harsh_acceleration_events'] * (harsh_acceleration_weight / 100)
-    score -= results['swerving_events'] * (swerving_weight / 100)
-    score -= results['over_speed_events'] * (overspeed_weight / 100)
-    score -= results['potential_swerving_events'] * (potential_swerving_weight / 100)
-
-    # Ensure the score doesn't go below 0%
-    score = max(score, 0)
+    """
+    Score the driving behavior with custom weights if available.
 
-    return score
+    The weights of a car are resolved once and cached (see api/scoring.py);
+    batch callers can resolve them with ``resolve_weights`` and call
+    ``score_events`` directly.
+    """
+    return score_events(results, resolve_weights(car_id))
 
 @csrf_exempt
 def get_score_pattern(request):
@@ -2304,6 +2292,9 @@ def get_score_pattern(request):
                         return JsonResponse({'error': 'Employee has no company'}, status=404)
                 except Employee.DoesNotExist:
                     return JsonResponse({'error': 'Employee not found'}, status=404)
+
+            # A new customer pattern takes precedence over the company one
+            invalidate_score_weights()
         
         # Return the pattern
         return JsonResponse({
@@ -2409,6 +2400,9 @@ def update_score_pattern(request):
                 'error': 'Invalid userType. Must be "customer", "company", "admin", or "employee"'
             }, status=400)
         
+        # Cars of this customer/company are scored with the new weights from now on
+        invalidate_score_weights()
+
         return JsonResponse({
             'success': True,
             'message': 'Score pattern updated successfully',
@@ -2427,7 +2421,11 @@ def update_score_pattern(request):
 @csrf_exempt
 def recalculate_car_scores(request):
     """
-    Recalculate scores for a car's recent driving data using the latest score pattern
+    Recalculate scores of recent driving data using the latest score pattern.
+
+    Either one car (carId) or every car of a company (companyId) is rescored.
+    Cars sharing the same weights are rescored together in one UPDATE, so the
+    work stays in the database whatever the number of records.
     """
     if request.method != 'POST':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
@@ -2435,50 +2433,44 @@ def recalculate_car_scores(request):
     try:
         data = json.loads(request.body)
         car_id = data.get('carId')
+        company_id = data.get('companyId')
         days = int(data.get('days', 7))  # Default to 7 days of data
         
-        if not car_id:
-            return JsonResponse({'error': 'Car ID is required'}, status=400)
+        if not car_id and not company_id:
+            return JsonResponse({'error': 'Car ID or Company ID is required'}, status=400)
         
-        # Get recent driving data for this car
-        from django.utils import timezone
-        from datetime import timedelta
+        if car_id:
+            try:
+                car_ids = [int(car_id)]
+            except (TypeError, ValueError):
+                return JsonResponse({'error': 'carId must be an integer'}, status=400)
+        else:
+            car_ids = list(Car.objects.filter(company_id=company_id).values_list('id', flat=True))
         
-        end_date = timezone.now()
-        start_date = end_date - timedelta(days=days)
+        start_date = timezone.now() - timedelta(days=days)
         
-        # Get driving data records
-        driving_records = DrivingData.objects.filter(
-            car_id=car_id,
-            created_at__gte=start_date
-        ).order_by('-created_at')
+        # Group the cars by their weights: one UPDATE per distinct pattern
+        groups = {}
+        for car, weights in resolve_weights_many(car_ids).items():
+            key = tuple(sorted(weights.items()))
+            groups.setdefault(key, (weights, []))[1].append(car)
         
         updated_count = 0
+        with transaction.atomic():
+            for weights, cars in groups.values():
+                driving_records = DrivingData.objects.filter(car_id__in=cars, created_at__gte=start_date)
+                updated_count += rescore_driving_data(driving_records, weights)
         
-        # Process each record
-        for record in driving_records:
-            # Create results dict from existing record
-            results = {
-                'harsh_braking_events': record.harsh_braking_events,
-                'harsh_acceleration_events': record.harsh_acceleration_events,
-                'swerving_events': record.swerving_events,
-                'potential_swerving_events': record.potential_swerving_events,
-                'over_speed_events': record.over_speed_events
-            }
-            
-            # Recalculate score using the latest pattern
-            new_score = score_chunk(None, results, car_id)
-            
-            # Update if different
-            if abs(record.score - new_score) > 0.01:  # Small tolerance for floating point comparison
-                record.score = new_score
-                record.save(update_fields=['score'])
-                updated_count += 1
+        if updated_count:
+            rebuild_rollups(car_ids, since=start_date)
+            rebuild_trips(car_ids, since=start_date)
+            bump_data_generation()
         
         return JsonResponse({
             'success': True,
             'message': f'Recalculated scores for {updated_count} records',
-            'updatedCount': updated_count
+            'updatedCount': updated_count,
+            'carCount': len(car_ids)
         })
     
     except Exception as e:
@@ -2489,7 +2481,9 @@ def recalculate_car_scores(request):
 def get_car_trips(request, car_id=None):
     """
     Get trip data for a specific car or all cars for a customer.
-    Trips are defined by driving data with gaps of 10+ minutes.
+    Trips are defined by driving data with gaps of 10+ minutes; they are built
+    at ingest and read from the Trip table. Trips ending in the time frame are
+    returned whole, newest first; ?page= and ?page_size= page through them.
     """
     try:
         # Get time frame parameter or default to 7d
@@ -2509,55 +2503,28 @@ def get_car_trips(request, car_id=None):
         else:
             start_date = now - timedelta(days=7)
         
-        # Get driving data for the specified car or all customer's cars
+        # Get the stored trips of the specified car or all customer's cars
+        # (10-minute gap defines a new trip, see api/trips.py)
         if car_id and car_id != 'all':
-            driving_data = DrivingData.objects.filter(
-                car_id=car_id,
-                created_at__gte=start_date
-            ).order_by('created_at')
-            
-            car_info = {car_id: Car.objects.get(id=car_id)}
+            car_ids = [car_id]
         else:
-            # Get all cars for this customer
-            cars = Car.objects.filter(customer_id=customer_id)
-            car_ids = cars.values_list('id', flat=True)
-            car_info = {car.id: car for car in cars}
-            
-            driving_data = DrivingData.objects.filter(
-                car_id__in=car_ids,
-                created_at__gte=start_date
-            ).order_by('created_at')
-        
-        # Group data into trips (10-minute gap defines a new trip)
-        trips = []
-        current_trip_data = []
-        current_car_id = None
-        
-        for data in driving_data:
-            # New car always starts a new trip
-            if current_car_id is not None and current_car_id != data.car_id.id:
-                if current_trip_data:
-                    trips.append(process_trip(current_trip_data, car_info[current_car_id]))
-                    current_trip_data = []
-            
-            # If current trip has data, check time gap
-            if current_trip_data:
-                time_gap = data.created_at - current_trip_data[-1].created_at
-                if time_gap > timedelta(minutes=10):
-                    # Gap is more than 10 minutes, process the current trip and start a new one
-                    trips.append(process_trip(current_trip_data, car_info[current_car_id]))
-                    current_trip_data = []
-            
-            # Add this data point to the current trip
-            current_trip_data.append(data)
-            current_car_id = data.car_id.id
-        
-        # Process the last trip if any
-        if current_trip_data:
-            trips.append(process_trip(current_trip_data, car_info[current_car_id]))
-        
-        # Sort trips by start time (newest first)
-        trips.sort(key=lambda x: x['start_time'], reverse=True)
+            car_ids = Car.objects.filter(customer_id=customer_id).values_list('id', flat=True)
+        
+        stored_trips = Trip.objects.filter(
+            car_id__in=car_ids,
+            end_time__gte=start_date
+        ).select_related('car_id').order_by('-start_time', '-id')
+        
+        # Optional paging, newest trips first
+        if 'page' in request.GET:
+            try:
+                page = max(int(request.GET.get('page')), 1)
+                page_size = min(max(int(request.GET.get('page_size', 50)), 1), 500)
+            except ValueError:
+                return JsonResponse({'error': 'page and page_size must be integers'}, status=400)
+            stored_trips = stored_trips[(page - 1) * page_size:page * page_size]
+        
+        trips = [TripTotals.from_trip(trip).summary(trip.car_id) for trip in stored_trips]
         
         return JsonResponse(trips, safe=False)
         
@@ -2565,45 +2532,6 @@ def get_car_trips(request, car_id=None):
         print(f"Error in get_car_trips: {str(e)}")
         return JsonResponse({'error': str(e)}, status=500)
 
-def process_trip(trip_data, car):
-    """Helper function to process a list of driving data into a trip summary"""
-    # Sort by time to ensure correct order
-    trip_data.sort(key=lambda x: x.created_at)
-    
-    start_time = trip_data[0].created_at
-    end_time = trip_data[-1].created_at
-    duration = (end_time - start_time).total_seconds() / 60  # minutes
-    
-    # Calculate total distance
-    total_distance = sum(data.distance for data in trip_data)
-    
-    # Calculate average score
-    avg_score = sum(data.score for data in trip_data) / len(trip_data) if trip_data else 0
-    
-    # Count events
-    harsh_braking = sum(data.harsh_braking_events for data in trip_data)
-    harsh_acceleration = sum(data.harsh_acceleration_events for data in trip_data)
-    swerving = sum(data.swerving_events for data in trip_data)
-    over_speed = sum(data.over_speed_events for data in trip_data)
-    
-    return {
-        'trip_id': f"{car.id}-{start_time.strftime('%Y%m%d%H%M%S')}",
-        'car_id': car.id,
-        'car_model': car.Model_of_car,
-        'plate_number': car.Plate_number,
-        'start_time': start_time.isoformat(),
-        'end_time': end_time.isoformat(),
-        'duration_minutes': round(duration, 1),
-        'distance_km': round(total_distance, 2),
-        'score': round(avg_score, 1),
-        'events': {
-            'harsh_braking': harsh_braking,
-            'harsh_acceleration': harsh_acceleration,
-            'swerving': swerving,
-            'over_speed': over_speed
-        }
-    }
-
 @csrf_exempt
 def simulate_driving_data(request):
     """
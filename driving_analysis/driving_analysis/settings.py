@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os
+import sys
 
 # SECURITY SETTINGS
 # Use environment variables for sensitive information
@@ -164,13 +165,45 @@ DATABASES = {
     }
 }
 
+# Shared by the MQTT ingest process and the web workers (see api/cache_backends)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
-        'LOCATION': '/tmp/django_cache',  # Use a directory that exists and is writable
+        'BACKEND': 'api.cache_backends.TieredCache',
+        # SQLite file shared by the ingest and web processes; unset, every checkout on the host
+        # shares /dev/shm/driving_analysis_cache.sqlite3, so give each deployment its own
+        'LOCATION': os.environ.get('CACHE_LOCATION'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '10000')),  # Entries kept in the shared tier
+            'MAX_BYTES': int(os.environ.get('CACHE_MAX_BYTES', str(256 * 1024 * 1024))),  # Pickled bytes kept in the shared tier
+            'EVICTION': os.environ.get('CACHE_EVICTION', 'lru'),  # 'lru' or 'fifo'
+            'LOCAL_MAX_ENTRIES': int(os.environ.get('CACHE_LOCAL_MAX_ENTRIES', '1000')),  # Hot entries kept per process
+            'LOCAL_TIMEOUT': float(os.environ.get('CACHE_LOCAL_TIMEOUT', '1.0')),  # Seconds a process trusts its local copy
+        },
     }
 }
 
+# Test runs keep their cache in the process, away from the shared file of a running deployment
+if sys.argv[1:2] == ['test']:
+    CACHES['default'] = {'BACKEND': 'api.cache_backends.LRUCache', 'LOCATION': 'default',
+                         'OPTIONS': {'MAX_ENTRIES': 10000}}
+
+# MQTT ingest pipeline (see api/ingest_pipeline.py)
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', '2'))  # Cleansing/analysis threads
+INGEST_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', '100'))  # Windows queued per worker
+INGEST_QUEUE_TIMEOUT = float(os.environ.get('INGEST_QUEUE_TIMEOUT', '0'))  # Seconds to wait on a full queue before dropping
+INGEST_WRITE_BATCH_SIZE = int(os.environ.get('INGEST_WRITE_BATCH_SIZE', '50'))  # Rows per database write
+INGEST_WRITE_INTERVAL = float(os.environ.get('INGEST_WRITE_INTERVAL', '1.0'))  # Max seconds a row waits for its batch
+INGEST_WRITE_MAX_PENDING = int(os.environ.get('INGEST_WRITE_MAX_PENDING', '500'))  # Rows kept for retry when writes fail
+INGEST_METRICS_INTERVAL = float(os.environ.get('INGEST_METRICS_INTERVAL', '60'))  # Seconds between metrics log lines
+INGEST_STREAMING_ANALYSIS = os.environ.get('INGEST_STREAMING_ANALYSIS', 'False') == 'True'  # Carry analysis windows across batches
+LOCATION_SNAPSHOT_INTERVAL = float(os.environ.get('LOCATION_SNAPSHOT_INTERVAL', '1.0'))  # Seconds between latest-position snapshots
+LIVE_FEED_MAX_RATE = float(os.environ.get('LIVE_FEED_MAX_RATE', '1.0'))  # Default live feed batches per second per client
+LIVE_FEED_KEEPALIVE = float(os.environ.get('LIVE_FEED_KEEPALIVE', '30'))  # Seconds between keep-alive comments on an idle live feed (0 = never)
+ANALYSIS_ENGINE = os.environ.get('ANALYSIS_ENGINE', 'pandas')  # 'pandas' or 'fused' (api/detection.py)
+SCORE_WEIGHTS_TTL = float(os.environ.get('SCORE_WEIGHTS_TTL', '300'))  # Seconds a car's resolved score weights are cached
+FLEET_OVERVIEW_TTL = float(os.environ.get('FLEET_OVERVIEW_TTL', '30'))  # Seconds dashboard aggregates are cached between ingests
+DRIVING_DATA_RETENTION_DAYS = int(os.environ.get('DRIVING_DATA_RETENTION_DAYS', '365'))  # Days of raw DrivingData kept by prune_driving_data
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -27,7 +27,6 @@ urlpatterns = [
     path('api/update_customer/<int:customer_id>/', views.update_customer, name='update_customer_api'),
     path('api/delete_customer/<int:customer_id>/', views.delete_customer, name='delete_customer_api'),  # Added API-style delete endpoint
     path('delete/<int:customer_id>/', views.delete_customer, name='delete_customer'),
-    path('cleanse-buffer/', views.cleanse_buffer_view, name='cleanse_buffer'),
     path('get-cleansed-data/', views.get_cleansed_data, name='get_cleansed_data'),
     path('get-analysis-results/', views.get_analysis_results, name='get-analysis-results'),
     path('api/get-latest-data/', views.get_latest_data, name='get-latest-data'),
@@ -57,6 +56,7 @@ urlpatterns = [
     path('api/geofences/<int:geofence_id>/delete/', views.delete_geofence, name='delete_geofence'),
     path('api/get-car-location/<int:car_id>/', views.get_car_location, name='get_car_location'),
     path('api/get-car-location/', views.get_car_location, name='get_all_car_locations'),
+    path('api/live-feed/', views.get_live_feed, name='live_feed'),
     path('api/company/<int:company_id>/', views.get_company, name='get_company'),
     path('api/customer/<int:customer_id>/', views.get_customer, name='get_customer'),   
     path('api/companies/', views.company_list, name='company_list'),
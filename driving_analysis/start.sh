@@ -2,5 +2,7 @@
 # Start the MQTT client in the background
 python manage.py mqtt_client &
 
-# Start the web server in the foreground
-gunicorn driving_analysis.wsgi:application
\ No newline at end of file
+# Start the web server in the foreground, under ASGI so the live feed
+# (api/live-feed/) can stream; for development use
+#   uvicorn driving_analysis.asgi:application --reload
+gunicorn driving_analysis.asgi:application -k uvicorn.workers.UvicornWorker